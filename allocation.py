@@ -0,0 +1,79 @@
+"""
+Vectorized profit allocation engine.
+
+Daily profits are split between the clients that hold capital on that date,
+proportionally to their capital. A client's capital is the running sum of
+their capital flows: the initial investment on the join date plus any later
+deposits and withdrawals (see capital_events). Instead of looping over every
+(date, client) pair, ``capital_matrix`` applies the flows in date order in one
+pass, and ``allocate_capital`` builds the whole P x C share matrix from the
+resulting capital and derives cumulative gains with a cumsum.
+"""
+
+import numpy as np
+
+
+def capital_matrix(days, flow_days, flow_columns, flow_amounts, n_clients, base=None):
+    """Return the len(days) x C matrix of each client's capital on each of ``days`` (sorted).
+
+    Flow i adds ``flow_amounts[i]`` to column ``flow_columns[i]`` from ``flow_days[i]``
+    on; ``base`` is the capital each client already had before the first flow.
+    """
+    days = np.asarray(days)
+    rows = np.searchsorted(days, np.asarray(flow_days), side="left")
+    deltas = np.zeros((len(days) + 1, n_clients))
+    np.add.at(deltas, (rows, np.asarray(flow_columns, dtype=int)), np.asarray(flow_amounts, dtype=float))
+    capital = np.cumsum(deltas[:-1], axis=0)
+    if base is not None:
+        capital += np.asarray(base, dtype=float)[np.newaxis, :]
+    return capital
+
+
+def allocate_capital(profit_amounts, capital):
+    """Return (shares, daily_gain, cumulative_gain) for a P x C matrix of capital on each profit date"""
+    capital = np.where(capital > 0, capital, 0.0)
+    totals = capital.sum(axis=1, keepdims=True)
+    shares = np.divide(capital, totals, out=np.zeros_like(capital), where=totals > 0)
+    daily_gain = np.asarray(profit_amounts, dtype=float)[:, np.newaxis] * shares
+    return shares, daily_gain, np.cumsum(daily_gain, axis=0)
+
+
+def client_allocation(profit_amounts, active_capital, client_capital):
+    """Allocation for a single client from the total active capital on each profit date.
+
+    Returns (active, share, daily_gain, cumulative_gain) arrays of length P. Only
+    the client's own capital on each date is needed, not the other clients' rows.
+    """
+    active_capital = np.asarray(active_capital, dtype=float)
+    client_capital = np.asarray(client_capital, dtype=float)
+    active = client_capital > 0
+    share = np.divide(client_capital, active_capital, out=np.zeros(len(client_capital)),
+                      where=active & (active_capital > 0))
+    daily_gain = np.asarray(profit_amounts, dtype=float) * share
+    return active, share, daily_gain, np.cumsum(daily_gain)
+
+
+def pct_return(cumulative_gain, invested):
+    """Cumulative gain as a percentage of invested capital (0 where nothing is invested)"""
+    invested = np.asarray(invested, dtype=float)
+    return np.divide(cumulative_gain * 100, invested, out=np.zeros_like(cumulative_gain), where=invested > 0)
+
+
+SHARE_LEDGER_COLUMNS = [
+    "client_id", "client_name", "profit_date", "invested", "share_pct",
+    "daily_profit", "share_profit", "cumulative_profit", "balance",
+]
+
+# Human-readable labels used by the Share Profit table and its exports
+SHARE_LEDGER_LABELS = {
+    "client_id": "Client ID",
+    "client_name": "Client Name",
+    "profit_date": "Profit Date",
+    "invested": "Capital",
+    "share_pct": "Share (%)",
+    "daily_profit": "Daily Profit",
+    "share_profit": "Share Profit",
+    "cumulative_profit": "Cumulative Profit",
+    "balance": "Total Balance",
+}
+
@@ -1,559 +1,218 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
-from datetime import datetime, timedelta
+import numpy as np
 from datetime import date as date_class
-import plotly.graph_objects as go
-import plotly.express as px
-from plotly.subplots import make_subplots
-import hashlib
+import functools
+import os
+import threading
 
-DB_PATH = "data.db"
-
-# ----------------------- Page Config -----------------------
-st.set_page_config(
-    page_title="Investment Consortium Dashboard",
-    page_icon="💰",
-    layout="wide",
-    initial_sidebar_state="expanded"
+import core
+import ledger
+import perf
+import recompute
+from allocation import SHARE_LEDGER_LABELS
+from chart_data import RESOLUTIONS, chart_series
+from core import (
+    add_capital_event, add_client, add_profit, delete_capital_event, delete_client, delete_profit, get_client_by_id,
+    update_client, update_profit, verify_admin, verify_client,
 )
+from db import get_manager
+from export import EXPORT_FORMATS, export_share_table
+from formatting import column_config, with_dates
+from funds import add_fund, list_funds, metrics_rollup, use_fund
+from importer import IMPORT_COLUMNS, bulk_import, read_table, validate
+from migrations import init_db
+from statements import STATEMENT_FORMATS, render_statement, statement_archive
 
 # ----------------------- Custom CSS -----------------------
+CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "style.css")
+
+@functools.lru_cache(maxsize=1)
+def _read_css():
+    with open(CSS_PATH, encoding="utf-8") as f:
+        return f.read()
+
 def load_css():
-    st.markdown("""
-    <style>
-    /* Dark theme colors */
-    :root {
-        --primary-color: #667eea;
-        --secondary-color: #764ba2;
-        --success-color: #2ecc71;
-        --danger-color: #e74c3c;
-        --warning-color: #f39c12;
-        --bg-dark: #0e1117;
-        --bg-secondary: #1a1d29;
-        --bg-card: #262730;
-        --text-primary: #ffffff;
-        --text-secondary: #b8b9bf;
-        --border-color: #2d3139;
-    }
-    
-    /* Main background */
-    .stApp {
-        background-color: var(--bg-dark);
-        color: var(--text-primary);
-    }
-    
-    /* Hide Streamlit branding */
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    
-    /* Custom card styling with dark theme */
-    .metric-card {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 20px;
-        border-radius: 12px;
-        box-shadow: 0 8px 16px rgba(0,0,0,0.4);
-        color: white;
-        margin: 10px 0;
-        border: 1px solid rgba(255,255,255,0.1);
-    }
-    
-    .metric-card h3 {
-        margin: 0;
-        font-size: 14px;
-        font-weight: 500;
-        opacity: 0.95;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-    }
-    
-    .metric-card p {
-        margin: 10px 0 0 0;
-        font-size: 32px;
-        font-weight: 700;
-    }
-    
-    /* Login card styling */
-    .login-card {
-        background: var(--bg-card);
-        padding: 2rem;
-        border-radius: 15px;
-        box-shadow: 0 10px 30px rgba(0,0,0,0.5);
-        margin: 2rem 0;
-        border: 1px solid var(--border-color);
-    }
-    
-    /* Button styling */
-    .stButton>button {
-        border-radius: 8px;
-        border: none;
-        padding: 0.6rem 1.2rem;
-        font-weight: 600;
-        transition: all 0.3s ease;
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-    }
-    
-    .stButton>button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 6px 20px rgba(102, 126, 234, 0.4);
-    }
-    
-    /* Input field styling */
-    .stTextInput>div>div>input, 
-    .stNumberInput>div>div>input,
-    .stTextArea textarea,
-    .stSelectbox>div>div>div,
-    .stDateInput>div>div>input {
-        background-color: var(--bg-card);
-        border: 1px solid var(--border-color);
-        border-radius: 8px;
-        padding: 0.6rem;
-        color: var(--text-primary);
-    }
-    
-    .stTextInput>div>div>input:focus,
-    .stNumberInput>div>div>input:focus,
-    .stTextArea textarea:focus {
-        border-color: var(--primary-color);
-        box-shadow: 0 0 0 2px rgba(102, 126, 234, 0.2);
-    }
-    
-    /* DataFrame styling */
-    .dataframe {
-        border-radius: 8px;
-        overflow: hidden;
-        background-color: var(--bg-card);
-    }
-    
-    div[data-testid="stDataFrame"] {
-        background-color: var(--bg-card);
-        border-radius: 8px;
-    }
-    
-    /* Sidebar styling */
-    [data-testid="stSidebar"] {
-        background: linear-gradient(180deg, #1a1d29 0%, #0e1117 100%);
-        border-right: 1px solid var(--border-color);
-    }
-    
-    [data-testid="stSidebar"] .stMarkdown {
-        color: var(--text-primary);
-    }
-    
-    [data-testid="stSidebar"] hr {
-        border-color: var(--border-color);
-    }
-    
-    /* Expander styling */
-    .streamlit-expanderHeader {
-        background-color: var(--bg-card);
-        border-radius: 8px;
-        border: 1px solid var(--border-color);
-        color: var(--text-primary);
-    }
-    
-    .streamlit-expanderHeader:hover {
-        border-color: var(--primary-color);
-    }
-    
-    .streamlit-expanderContent {
-        background-color: var(--bg-secondary);
-        border: 1px solid var(--border-color);
-        border-top: none;
-    }
-    
-    /* Success/Error message styling */
-    .stSuccess {
-        background-color: rgba(46, 204, 113, 0.1);
-        border: 1px solid var(--success-color);
-        border-radius: 8px;
-        padding: 1rem;
-        color: var(--success-color);
-    }
-    
-    .stError {
-        background-color: rgba(231, 76, 60, 0.1);
-        border: 1px solid var(--danger-color);
-        border-radius: 8px;
-        padding: 1rem;
-        color: var(--danger-color);
-    }
-    
-    .stWarning {
-        background-color: rgba(243, 156, 18, 0.1);
-        border: 1px solid var(--warning-color);
-        border-radius: 8px;
-        padding: 1rem;
-        color: var(--warning-color);
-    }
-    
-    .stInfo {
-        background-color: rgba(102, 126, 234, 0.1);
-        border: 1px solid var(--primary-color);
-        border-radius: 8px;
-        padding: 1rem;
-        color: var(--primary-color);
-    }
-    
-    /* Title styling */
-    h1 {
-        color: var(--text-primary);
-        font-weight: 700;
-    }
-    
-    h2 {
-        color: var(--text-primary);
-        font-weight: 600;
-        margin-top: 2rem;
-    }
-    
-    h3 {
-        color: var(--text-secondary);
-        font-weight: 500;
-    }
-    
-    /* Tab styling */
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 8px;
-        background-color: var(--bg-secondary);
-        padding: 8px;
-        border-radius: 8px;
-    }
-    
-    .stTabs [data-baseweb="tab"] {
-        border-radius: 8px;
-        padding: 10px 20px;
-        background-color: transparent;
-        color: var(--text-secondary);
-        border: 1px solid transparent;
-    }
-    
-    .stTabs [data-baseweb="tab"]:hover {
-        background-color: var(--bg-card);
-        color: var(--text-primary);
-    }
-    
-    .stTabs [data-baseweb="tab"][aria-selected="true"] {
-        background-color: var(--bg-card);
-        color: var(--primary-color);
-        border-color: var(--primary-color);
-    }
-    
-    /* Metric styling */
-    [data-testid="stMetricValue"] {
-        color: var(--text-primary);
-    }
-    
-    [data-testid="stMetricDelta"] {
-        color: var(--success-color);
-    }
-    
-    /* Radio button styling */
-    .stRadio > label {
-        color: var(--text-primary);
-    }
-    
-    /* Selectbox styling */
-    .stSelectbox label {
-        color: var(--text-primary);
-    }
-    
-    /* Multiselect styling */
-    .stMultiSelect label {
-        color: var(--text-primary);
-    }
-    
-    /* Download button styling */
-    .stDownloadButton>button {
-        background: linear-gradient(135deg, #2ecc71 0%, #27ae60 100%);
-        color: white;
-        border: none;
-    }
-    
-    .stDownloadButton>button:hover {
-        box-shadow: 0 6px 20px rgba(46, 204, 113, 0.4);
-    }
-    
-    /* Form styling */
-    [data-testid="stForm"] {
-        background-color: var(--bg-card);
-        border: 1px solid var(--border-color);
-        border-radius: 8px;
-        padding: 1rem;
-    }
-    
-    /* Divider */
-    hr {
-        border-color: var(--border-color);
-        margin: 2rem 0;
-    }
-    
-    /* Scrollbar styling */
-    ::-webkit-scrollbar {
-        width: 10px;
-        height: 10px;
-    }
-    
-    ::-webkit-scrollbar-track {
-        background: var(--bg-secondary);
-    }
-    
-    ::-webkit-scrollbar-thumb {
-        background: var(--border-color);
-        border-radius: 5px;
-    }
-    
-    ::-webkit-scrollbar-thumb:hover {
-        background: var(--primary-color);
-    }
-    
-    /* Custom dark boxes */
-    .dark-box {
-        background-color: var(--bg-card);
-        border: 1px solid var(--border-color);
-        border-radius: 8px;
-        padding: 1rem;
-        margin: 1rem 0;
-    }
-    
-    /* Label styling */
-    label {
-        color: var(--text-primary) !important;
-    }
-    
-    /* Plotly chart background */
-    .js-plotly-plot {
-        background-color: var(--bg-card) !important;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    st.markdown(f"<style>\n{_read_css()}</style>", unsafe_allow_html=True)
 
-# ----------------------- Password Hashing -----------------------
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+# ----------------------- Result caching -----------------------
+# Read results are shared across all sessions through st.cache_data, with one
+# cache per function and database file, keyed on the file's data version (which
+# changes with every commit, from any process) and the arguments. Once the data
+# version changes, that file's caches are cleared, so entries for old data do
+# not linger until evicted and other funds' entries are kept.
+CACHE_MAX_ENTRIES = 128
 
-# ----------------------- Database helpers -----------------------
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Create clients table
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS clients (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        invested REAL NOT NULL,
-        join_date TEXT NOT NULL,
-        note TEXT
-    )""")
-    
-    # Check if password column exists, if not add it
-    c.execute("PRAGMA table_info(clients)")
-    columns = [column[1] for column in c.fetchall()]
-    if 'password' not in columns:
-        c.execute("ALTER TABLE clients ADD COLUMN password TEXT")
-        # Set default password for existing clients
-        default_password = hash_password("client123")
-        c.execute("UPDATE clients SET password = ? WHERE password IS NULL", (default_password,))
-        print("✅ Added password column to clients table and set default passwords")
-    
-    # Create profits table
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS profits (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        profit_date TEXT NOT NULL UNIQUE,
-        total_profit REAL NOT NULL,
-        note TEXT
-    )""")
-    
-    # Create admin_users table
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS admin_users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT NOT NULL UNIQUE,
-        password TEXT NOT NULL
-    )""")
-    
-    # Create default admin if not exists
-    c.execute("SELECT COUNT(*) FROM admin_users WHERE username='admin'")
-    if c.fetchone()[0] == 0:
-        c.execute("INSERT INTO admin_users (username, password) VALUES (?, ?)", 
-                 ("admin", hash_password("admin123")))
-        print("✅ Created default admin user")
-    
-    conn.commit()
-    conn.close()
-    print("✅ Database initialized successfully")
+_cached_funcs = {}
+_caches = {}
+_cache_versions = {}
+_cache_lock = threading.Lock()
+_cache_stats = {}
+_cache_stats_lock = threading.Lock()
 
-def run_query(query, params=(), fetch=False):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute(query, params)
-    if fetch:
-        rows = c.fetchall()
-        conn.close()
-        return rows
-    conn.commit()
-    conn.close()
+def _count_cache(name, key):
+    with _cache_stats_lock:
+        _cache_stats.setdefault(name, {"calls": 0, "misses": 0})[key] += 1
 
-# ----------------------- Authentication -----------------------
-def verify_admin(username, password):
-    rows = run_query("SELECT password FROM admin_users WHERE username=?", (username,), fetch=True)
-    if rows:
-        return rows[0][0] == hash_password(password)
-    return False
+def _function_cache(name, db_path):
+    """st.cache_data of function ``name`` for one database file"""
+    with _cache_lock:
+        cache = _caches.get((name, db_path))
+        if cache is None:
+            func = _cached_funcs[name]
+            def call(version, args):
+                _count_cache(name, "misses")
+                return func(*args)
+            # st.cache_data tells functions apart by qualified name
+            call.__qualname__ = f"{name}[{db_path}]"
+            cache = _caches[(name, db_path)] = st.cache_data(show_spinner=False, max_entries=CACHE_MAX_ENTRIES)(call)
+        return cache
 
-def verify_client(client_id, password):
-    rows = run_query("SELECT password FROM clients WHERE id=?", (client_id,), fetch=True)
-    if rows:
-        return rows[0][0] == hash_password(password)
-    return False
+def _current_version(manager):
+    """Data version of ``manager``'s database, clearing its caches when it changed since the last call"""
+    version = manager.data_version
+    with _cache_lock:
+        if _cache_versions.get(manager.path) == version:
+            return version
+        _cache_versions[manager.path] = version
+        stale = [cache for (_, path), cache in _caches.items() if path == manager.path]
+    for cache in stale:
+        cache.clear()
+    return version
 
-def get_client_by_id(client_id):
-    rows = run_query("SELECT id, name, invested, join_date, note FROM clients WHERE id=?", (client_id,), fetch=True)
-    if rows:
-        return {
-            "id": rows[0][0],
-            "name": rows[0][1],
-            "invested": rows[0][2],
-            "join_date": rows[0][3],
-            "note": rows[0][4]
-        }
-    return None
+def cached(func):
+    """Cache ``func``'s result per database, data version and arguments"""
+    _cached_funcs[func.__name__] = func
 
-# ----------------------- CRUD operations -----------------------
-def add_client(name, invested, join_date, note="", password=""):
-    hashed_pw = hash_password(password) if password else hash_password("client123")
-    run_query("INSERT INTO clients (name, invested, join_date, note, password) VALUES (?, ?, ?, ?, ?)", 
-              (name, invested, join_date, note, hashed_pw))
+    @functools.wraps(func)
+    def wrapper(*args):
+        _count_cache(func.__name__, "calls")
+        manager = get_manager()
+        version = _current_version(manager)
+        return _function_cache(func.__name__, manager.path)(version, args)
+    return wrapper
 
-def update_client(client_id, name, invested, join_date, note="", password=None):
-    if password:
-        run_query("UPDATE clients SET name=?, invested=?, join_date=?, note=?, password=? WHERE id=?", 
-                 (name, invested, join_date, note, hash_password(password), client_id))
-    else:
-        run_query("UPDATE clients SET name=?, invested=?, join_date=?, note=? WHERE id=?", 
-                 (name, invested, join_date, note, client_id))
+def cache_stats():
+    """Hit / miss counters per cached function"""
+    with _cache_stats_lock:
+        rows = [
+            {"function": name, "hits": s["calls"] - s["misses"], "misses": s["misses"]}
+            for name, s in sorted(_cache_stats.items())
+        ]
+    return pd.DataFrame(rows, columns=["function", "hits", "misses"])
 
-def delete_client(client_id):
-    run_query("DELETE FROM clients WHERE id=?", (client_id,))
+# Cached views of the read functions in core.py
+list_clients_df = cached(core.list_clients_df)
+list_profits_df = cached(core.list_profits_df)
+list_capital_events_df = cached(core.list_capital_events_df)
+compute_client_statement = cached(core.compute_client_statement)
+get_dashboard_metrics = cached(core.get_dashboard_metrics)
+balances_as_of = cached(core.balances_as_of)
 
-def list_clients_df():
-    rows = run_query("SELECT id, name, invested, join_date, note FROM clients ORDER BY id", fetch=True)
-    return pd.DataFrame(rows, columns=["id","name","invested","join_date","note"]) if rows else pd.DataFrame(columns=["id","name","invested","join_date","note"])
+# Paged share table and its aggregates, queried straight from the ledger
+get_share_page = cached(ledger.query_share_page)
+get_share_summary = cached(ledger.share_summary)
+get_share_totals_by_client = cached(ledger.share_totals_by_client)
+get_share_totals_by_date = cached(ledger.share_totals_by_date)
 
-def add_profit(profit_date, total_profit, note=""):
-    run_query("INSERT OR REPLACE INTO profits (profit_date, total_profit, note) VALUES (?, ?, ?)", 
-              (profit_date, total_profit, note))
 
-def update_profit(profit_id, profit_date, total_profit, note=""):
-    run_query("UPDATE profits SET profit_date=?, total_profit=?, note=? WHERE id=?", 
-              (profit_date, total_profit, note, profit_id))
+# ----------------------- Funds -----------------------
+def current_fund():
+    """The fund this session works on: the one picked in the sidebar, else the first registered fund"""
+    funds = list_funds()
+    keys = [fund["key"] for fund in funds]
+    if st.session_state.get("fund_key") not in keys:
+        st.session_state["fund_key"] = keys[0]
+    return funds[keys.index(st.session_state["fund_key"])]
 
-def delete_profit(profit_id):
-    run_query("DELETE FROM profits WHERE id=?", (profit_id,))
+def _switch_fund():
+    st.session_state["fund_key"] = st.session_state["fund_select"]
+    # Prepared downloads belong to the previous fund
+    _discard_prepared("share_export")
+    _discard_prepared("statement_archive")
 
-def list_profits_df():
-    rows = run_query("SELECT id, profit_date, total_profit, note FROM profits ORDER BY profit_date", fetch=True)
-    return pd.DataFrame(rows, columns=["id","profit_date","total_profit","note"]) if rows else pd.DataFrame(columns=["id","profit_date","total_profit","note"])
+def sign_out():
+    """Forget the session's login (every fund has its own admins and clients)"""
+    for key in ("user_type", "username", "client_id", "client_name", "auth_fund"):
+        st.session_state.pop(key, None)
+    st.session_state["user_type"] = None
 
-# ----------------------- Allocation & calculations -----------------------
-def allocations_for_date(target_date):
-    clients = list_clients_df()
-    if clients.empty:
-        return pd.DataFrame(columns=["id","name","invested","join_date","active","share","alloc_profit"])
-    clients["join_date"] = pd.to_datetime(clients["join_date"]).dt.date
-    target = datetime.strptime(target_date, "%Y-%m-%d").date() if isinstance(target_date, str) else target_date
-    clients["active"] = clients["join_date"] <= target
-    active_sum = clients.loc[clients["active"], "invested"].sum()
-    if active_sum == 0:
-        clients["share"] = 0.0
-    else:
-        clients["share"] = clients["invested"] / active_sum
-        clients.loc[~clients["active"], "share"] = 0.0
-    return clients
+def check_fund_login(fund):
+    """Sign the session out if it logged in to a different fund than ``fund``"""
+    user_type = st.session_state.get("user_type")
+    if user_type and st.session_state.get("auth_fund") != fund["key"]:
+        sign_out()
+        # Straight to the login form of the fund that was switched to
+        st.session_state["login_page"] = user_type
 
-def compute_client_timeseries():
-    profits = list_profits_df()
-    clients = list_clients_df()
-    if profits.empty or clients.empty:
-        return {}, profits, clients
-    profits["profit_date"] = pd.to_datetime(profits["profit_date"]).dt.date
-    clients["join_date"] = pd.to_datetime(clients["join_date"]).dt.date
+def fund_switcher(fund):
+    """Sidebar fund picker, shown once more than one fund is registered; clients stay on their own fund"""
+    names = {f["key"]: f["name"] for f in list_funds()}
+    if len(names) < 2:
+        return
+    st.selectbox(
+        "🏦 Fund",
+        list(names),
+        index=list(names).index(fund["key"]),
+        format_func=names.get,
+        key="fund_select",
+        on_change=_switch_fund,
+        disabled=st.session_state.get("user_type") == "client",
+        help="Every fund has its own logins: switching funds signs you out of this one.",
+    )
 
-    profits = profits.sort_values("profit_date")
-    client_ids = clients["id"].tolist()
-    timeseries = {cid: [] for cid in client_ids}
-    dates = []
-    cum_gain = {cid: 0.0 for cid in client_ids}
 
-    for _, row in profits.iterrows():
-        d = row["profit_date"]
-        dates.append(d)
-        total_profit = row["total_profit"]
-        active = clients[clients["join_date"] <= d]
-        total_active = active["invested"].sum()
-        
-        if total_active == 0:
-            for cid in client_ids:
-                timeseries[cid].append(cum_gain[cid])
-        else:
-            for _, c in clients.iterrows():
-                cid = c["id"]
-                if c["join_date"] <= d:
-                    share = c["invested"] / total_active if total_active>0 else 0.0
-                    gain = total_profit * share
-                else:
-                    gain = 0.0
-                cum_gain[cid] += gain
-                timeseries[cid].append(cum_gain[cid])
-    
-    result = {}
-    for _, c in clients.iterrows():
-        cid = c["id"]
-        invested = c["invested"]
-        gains = timeseries[cid] if len(timeseries[cid])>0 else []
-        pct = [(g / invested * 100) if invested>0 else 0.0 for g in gains]
-        result[cid] = {
-            "name": c["name"],
-            "invested": invested,
-            "join_date": c["join_date"],
-            "dates": dates,
-            "cumulative_gain": gains,
-            "pct_return": pct
-        }
-    return result, profits, clients
+# ----------------------- Background recompute -----------------------
+# Writes return as soon as they commit; the shared worker refreshes the ledger
+# afterwards. Until it is done, ledger figures lag the latest writes.
+@st.cache_resource(show_spinner=False, validate=lambda worker: worker.is_alive())
+def recompute_worker(db_path):
+    """Ledger refresh worker for ``db_path``, shared by every session"""
+    return recompute.start_worker(get_manager(db_path))
 
-def get_client_timeseries(client_id):
-    """Get timeseries data for a specific client"""
-    result, profits, clients = compute_client_timeseries()
-    return result.get(client_id, None)
+@st.fragment(run_every=1)
+def _recompute_badge(db_path):
+    if recompute_worker(db_path).pending:
+        st.badge("Recomputing…", icon="⏳", color="orange")
+        st.caption("Shares, gains and balances below do not include the latest changes yet and may not match "
+                   "the capital figures until the recompute finishes.")
+    else:
+        st.rerun()
 
-# ----------------------- Dashboard Metrics -----------------------
-def get_dashboard_metrics():
-    clients = list_clients_df()
-    profits = list_profits_df()
-    
-    total_clients = len(clients)
-    total_invested = clients["invested"].sum() if not clients.empty else 0
-    total_profit = profits["total_profit"].sum() if not profits.empty else 0
-    avg_return = (total_profit / total_invested * 100) if total_invested > 0 else 0
-    
-    return {
-        "total_clients": total_clients,
-        "total_invested": total_invested,
-        "total_profit": total_profit,
-        "avg_return": avg_return
-    }
+def recompute_status():
+    """Show a badge while the ledger is being recomputed; the page reruns when it is done"""
+    db_path = get_manager().path
+    if recompute_worker(db_path).pending:
+        _recompute_badge(db_path)
+
+
+# ----------------------- Chart controls -----------------------
+def date_range_slider(label, first, last):
+    """(start, end) picked on a date slider over [first, last]; narrowing it brings back daily points"""
+    if first >= last:
+        return first, last
+    return st.slider(label, min_value=first, max_value=last, value=(first, last), format="DD MMM YYYY")
+
+def series_caption(series):
+    resolution = "LTTB-downsampled" if series["resolution"] == "LTTB" else series["resolution"].lower()
+    return f"Showing {series['points']:,} {resolution} points for {series['total']:,} profit dates"
 
 # ----------------------- Admin Panel -----------------------
-def admin_panel():
+SHARE_PAGE_SIZES = [50, 100, 250, 500]
+
+STATEMENT_JOBS = min(4, os.cpu_count() or 1)
+
+def _discard_prepared(key):
+    """Delete the prepared download file stored under ``key``, if any"""
+    prepared = st.session_state.pop(key, None)
+    if prepared and os.path.exists(prepared["path"]):
+        os.remove(prepared["path"])
+
+def admin_panel(metrics):
     st.title("🔐 Admin Dashboard")
     st.markdown("---")
     
     # Metrics Overview
-    metrics = get_dashboard_metrics()
     
     col1, col2, col3, col4 = st.columns(4)
     with col1:
@@ -588,12 +247,20 @@ def admin_panel():
         </div>
         """, unsafe_allow_html=True)
     
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Profit MTD", f"Rp {metrics['mtd_profit']:,.0f}")
+    with col2:
+        st.metric("Profit YTD", f"Rp {metrics['ytd_profit']:,.0f}")
+    with col3:
+        st.metric(f"Profit Last {metrics['last_n_days']} Days", f"Rp {metrics['last_n_days_profit']:,.0f}")
+    
     st.markdown("<br>", unsafe_allow_html=True)
     
     # Tabs for better organization
-    tab1, tab2, tab3 = st.tabs(["👥 Client Management", "💹 Profit Management", "📊 Share Profit"])
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["👥 Client Management", "💹 Profit Management", "📊 Share Profit", "📥 Bulk Import", "🏦 Funds", "⏱️ Performance"])
     
-    with tab1:
+    with tab1, perf.section("Client Management"):
         st.subheader("Client Management")
         
         # Check if there are clients with default password
@@ -627,16 +294,12 @@ def admin_panel():
             if not clients_df.empty:
                 st.markdown("### 📋 Current Clients")
                 
-                # Format the dataframe for better display
-                display_df = clients_df.copy()
-                display_df["invested"] = display_df["invested"].apply(lambda x: f"Rp {x:,.0f}")
-                display_df["join_date"] = pd.to_datetime(display_df["join_date"]).dt.strftime("%d %b %Y")
-                
                 st.dataframe(
-                    display_df,
+                    with_dates(clients_df, "join_date"),
                     use_container_width=True,
                     height=400,
-                    hide_index=True
+                    hide_index=True,
+                    column_config=column_config(money=["invested", "capital"], dates=["join_date"])
                 )
                 
                 st.markdown("### ✏️ Edit / Delete Client")
@@ -663,21 +326,67 @@ def admin_panel():
                             delete = st.form_submit_button("🗑️ Delete", use_container_width=True, type="primary")
                         
                         if update:
-                            if e_password:
-                                update_client(edit_id, e_name, float(e_invested), e_join.isoformat(), e_note, e_password)
-                            else:
-                                update_client(edit_id, e_name, float(e_invested), e_join.isoformat(), e_note)
-                            st.success("✅ Client updated successfully!")
-                            st.rerun()
+                            try:
+                                if e_password:
+                                    update_client(edit_id, e_name, float(e_invested), e_join.isoformat(), e_note, e_password)
+                                else:
+                                    update_client(edit_id, e_name, float(e_invested), e_join.isoformat(), e_note)
+                                st.success("✅ Client updated successfully!")
+                                st.rerun()
+                            except ValueError as e:
+                                st.error(f"⚠️ {e}")
                         
                         if delete:
                             delete_client(edit_id)
                             st.success("✅ Client deleted successfully!")
                             st.rerun()
+                    
+                    st.markdown("### 💸 Deposits & Withdrawals")
+                    with st.form("capital_event_form"):
+                        c1, c2, c3 = st.columns(3)
+                        with c1:
+                            ev_kind = st.radio("Type", ["Deposit", "Withdrawal"], horizontal=True)
+                        with c2:
+                            ev_date = st.date_input("Date", value=date_class.today())
+                        with c3:
+                            ev_amount = st.number_input("Amount (Rp)", min_value=0.0, format="%.2f")
+                        ev_note = st.text_input("Note (optional)")
+                        if st.form_submit_button("💾 Record", use_container_width=True):
+                            if ev_amount > 0:
+                                try:
+                                    add_capital_event(edit_id, ev_date.isoformat(),
+                                                      ev_amount if ev_kind == "Deposit" else -ev_amount, ev_note)
+                                    st.success(f"✅ {ev_kind} recorded!")
+                                    st.rerun()
+                                except ValueError as e:
+                                    st.error(f"⚠️ {e}")
+                            else:
+                                st.error("⚠️ Amount must be greater than 0")
+                    
+                    events_df = list_capital_events_df(edit_id)
+                    if not events_df.empty:
+                        st.dataframe(
+                            with_dates(events_df[["id", "event_date", "amount", "note"]], "event_date"),
+                            use_container_width=True,
+                            hide_index=True,
+                            column_config=column_config(money=["amount"], dates=["event_date"])
+                        )
+                        ev_col1, ev_col2 = st.columns([3, 1])
+                        with ev_col1:
+                            ev_delete_id = st.selectbox("Select Event ID", events_df["id"].tolist())
+                        with ev_col2:
+                            st.markdown("<br>", unsafe_allow_html=True)
+                            if st.button("🗑️ Delete Event", use_container_width=True):
+                                try:
+                                    delete_capital_event(ev_delete_id)
+                                    st.success("✅ Event deleted!")
+                                    st.rerun()
+                                except ValueError as e:
+                                    st.error(f"⚠️ {e}")
             else:
                 st.info("📭 No clients yet. Add your first client to get started!")
     
-    with tab2:
+    with tab2, perf.section("Profit Management"):
         st.subheader("Profit Management")
         
         col1, col2 = st.columns([1, 2])
@@ -700,18 +409,12 @@ def admin_panel():
             if not profits_df.empty:
                 st.markdown("### 📊 Profit History")
                 
-                # Format the dataframe
-                display_df = profits_df.copy()
-                display_df["total_profit"] = display_df["total_profit"].apply(
-                    lambda x: f"Rp {x:,.0f}" if x >= 0 else f"-Rp {abs(x):,.0f}"
-                )
-                display_df["profit_date"] = pd.to_datetime(display_df["profit_date"]).dt.strftime("%d %b %Y")
-                
                 st.dataframe(
-                    display_df,
+                    with_dates(profits_df, "profit_date"),
                     use_container_width=True,
                     height=400,
-                    hide_index=True
+                    hide_index=True,
+                    column_config=column_config(money=["total_profit"], dates=["profit_date"])
                 )
                 
                 st.markdown("### ✏️ Edit / Delete Profit Entry")
@@ -747,7 +450,7 @@ def admin_panel():
             else:
                 st.info("📭 No profit entries yet. Add your first entry to get started!")
     
-    with tab3:
+    with tab3, perf.section("Share Profit"):
         st.subheader("📊 Profit Share Distribution")
         st.markdown("View detailed profit distribution across all clients and dates")
         
@@ -759,141 +462,165 @@ def admin_panel():
         elif profits_df.empty:
             st.warning("⚠️ No profit entries yet. Please add profit entries first.")
         else:
-            # Get timeseries data for all clients
-            result, _, _ = compute_client_timeseries()
+            # Sorting and filtering options
+            st.markdown("### ⚙️ Filter & Sort Options")
+            col1, col2, col3 = st.columns(3)
             
-            # Build comprehensive share profit table
-            share_data = []
+            with col1:
+                sort_by = st.selectbox(
+                    "Sort by",
+                    ["Profit Date", "Client ID", "Share Profit", "Total Balance"],
+                    index=0,
+                    key="sort_by_select"
+                )
             
-            for client_id, client_ts in result.items():
-                client_info = clients_df[clients_df['id'] == client_id].iloc[0]
-                
-                if len(client_ts['dates']) > 0:
-                    for idx, date in enumerate(client_ts['dates']):
-                        profit_row = profits_df[pd.to_datetime(profits_df['profit_date']).dt.date == date]
-                        
-                        if not profit_row.empty:
-                            daily_profit = profit_row.iloc[0]['total_profit']
-                            
-                            # Calculate share for this date
-                            allocs = allocations_for_date(date.isoformat())
-                            client_alloc = allocs[allocs['id'] == client_id]
-                            
-                            if not client_alloc.empty and client_alloc.iloc[0]['active']:
-                                share_pct = client_alloc.iloc[0]['share']
-                                share_amount = daily_profit * share_pct
-                                cumulative_gain = client_ts['cumulative_gain'][idx]
-                                total_balance = client_info['invested'] + cumulative_gain
-                                
-                                share_data.append({
-                                    'Client ID': client_id,
-                                    'Client Name': client_info['name'],
-                                    'Profit Date': date,
-                                    'Initial Invested': client_info['invested'],
-                                    'Share (%)': share_pct * 100,
-                                    'Daily Profit': daily_profit,
-                                    'Share Profit': share_amount,
-                                    'Cumulative Profit': cumulative_gain,
-                                    'Total Balance': total_balance
-                                })
+            with col2:
+                sort_order = st.radio("Order", ["Descending", "Ascending"], horizontal=True, key="sort_order_radio")
             
-            if share_data:
-                share_df = pd.DataFrame(share_data)
-                
-                # Sorting and filtering options
-                st.markdown("### ⚙️ Filter & Sort Options")
-                col1, col2, col3 = st.columns(3)
-                
-                with col1:
-                    sort_by = st.selectbox(
-                        "Sort by",
-                        ["Profit Date", "Client ID", "Share Profit", "Total Balance"],
-                        index=0,
-                        key="sort_by_select"
-                    )
-                
-                with col2:
-                    sort_order = st.radio("Order", ["Descending", "Ascending"], horizontal=True, key="sort_order_radio")
-                
-                with col3:
-                    filter_client = st.multiselect(
-                        "Filter by Client",
-                        options=clients_df['id'].tolist(),
-                        format_func=lambda x: f"ID {x} - {clients_df[clients_df['id']==x]['name'].iloc[0]}",
-                        key="filter_client_multi"
-                    )
-                
-                # Apply filters
-                display_df = share_df.copy()
-                if filter_client:
-                    display_df = display_df[display_df['Client ID'].isin(filter_client)]
-                
-                # Apply sorting
-                sort_col_map = {
-                    "Profit Date": "Profit Date",
-                    "Client ID": "Client ID",
-                    "Share Profit": "Share Profit",
-                    "Total Balance": "Total Balance"
-                }
-                ascending = sort_order == "Ascending"
-                display_df = display_df.sort_values(sort_col_map[sort_by], ascending=ascending)
-                
-                # Format for display
-                format_df = display_df.copy()
-                format_df['Profit Date'] = pd.to_datetime(format_df['Profit Date']).dt.strftime('%d %b %Y')
-                format_df['Initial Invested'] = format_df['Initial Invested'].apply(lambda x: f"Rp {x:,.0f}")
-                format_df['Share (%)'] = format_df['Share (%)'].apply(lambda x: f"{x:.2f}%")
-                format_df['Daily Profit'] = format_df['Daily Profit'].apply(
-                    lambda x: f"Rp {x:,.0f}" if x >= 0 else f"-Rp {abs(x):,.0f}"
-                )
-                format_df['Share Profit'] = format_df['Share Profit'].apply(
-                    lambda x: f"Rp {x:,.0f}" if x >= 0 else f"-Rp {abs(x):,.0f}"
-                )
-                format_df['Cumulative Profit'] = format_df['Cumulative Profit'].apply(
-                    lambda x: f"Rp {x:,.0f}" if x >= 0 else f"-Rp {abs(x):,.0f}"
+            with col3:
+                filter_client = st.multiselect(
+                    "Filter by Client",
+                    options=clients_df['id'].tolist(),
+                    format_func=lambda x: f"ID {x} - {clients_df[clients_df['id']==x]['name'].iloc[0]}",
+                    key="filter_client_multi"
                 )
-                format_df['Total Balance'] = format_df['Total Balance'].apply(lambda x: f"Rp {x:,.0f}")
-                
+            
+            # Filtering, sorting and paging run in SQLite; only the visible page is loaded
+            sort_key_map = {
+                "Profit Date": "profit_date",
+                "Client ID": "client_id",
+                "Share Profit": "share_profit",
+                "Total Balance": "balance"
+            }
+            client_filter = tuple(sorted(int(cid) for cid in filter_client))
+            summary = get_share_summary(client_filter)
+            
+            if summary["records"] > 0:
                 # Display summary metrics
                 st.markdown("### 📈 Summary Statistics")
                 col1, col2, col3, col4 = st.columns(4)
                 
-                total_records = len(display_df)
-                total_share_profit = display_df['Share Profit'].sum()
-                avg_share_profit = display_df['Share Profit'].mean()
-                unique_clients = display_df['Client ID'].nunique()
-                
                 with col1:
-                    st.metric("Total Records", f"{total_records:,}")
+                    st.metric("Total Records", f"{summary['records']:,}")
                 with col2:
-                    st.metric("Total Shared Profit", f"Rp {total_share_profit:,.0f}")
+                    st.metric("Total Shared Profit", f"Rp {summary['total_share_profit']:,.0f}")
                 with col3:
-                    st.metric("Avg Share Profit", f"Rp {avg_share_profit:,.0f}")
+                    st.metric("Avg Share Profit", f"Rp {summary['avg_share_profit']:,.0f}")
                 with col4:
-                    st.metric("Active Clients", unique_clients)
+                    st.metric("Active Clients", summary["clients"])
                 
                 st.markdown("---")
                 
                 # Display main table
                 st.markdown("### 📋 Detailed Share Profit Table")
+                col1, col2 = st.columns([1, 3])
+                with col1:
+                    page_size = st.selectbox("Rows per page", SHARE_PAGE_SIZES, index=1, key="share_page_size")
+                n_pages = max(1, -(-summary["records"] // page_size))
+                with col2:
+                    page = st.number_input(f"Page (of {n_pages:,})", min_value=1, max_value=n_pages, value=1, step=1, key="share_page")
+                
+                display_df = get_share_page(
+                    client_filter,
+                    sort_key_map[sort_by],
+                    sort_order == "Ascending",
+                    page_size,
+                    (min(page, n_pages) - 1) * page_size
+                ).rename(columns=SHARE_LEDGER_LABELS)
                 st.dataframe(
-                    format_df,
+                    with_dates(display_df, "Profit Date"),
                     use_container_width=True,
                     height=500,
-                    hide_index=True
+                    hide_index=True,
+                    column_config=column_config(
+                        money=["Capital", "Daily Profit", "Share Profit", "Cumulative Profit", "Total Balance"],
+                        percent=["Share (%)"],
+                        dates=["Profit Date"]
+                    )
                 )
                 
-                # Download button
+                # Export: the file is only built when requested, by streaming ledger rows to disk
                 st.markdown("---")
-                csv = display_df.to_csv(index=False)
-                today_str = date_class.today().isoformat()
-                st.download_button(
-                    label="📥 Download as CSV",
-                    data=csv,
-                    file_name=f"share_profit_distribution_{today_str}.csv",
-                    mime="text/csv",
-                    use_container_width=True
+                col1, col2 = st.columns([1, 2])
+                with col1:
+                    export_format = st.selectbox("Export format", list(EXPORT_FORMATS), key="share_export_format")
+                with col2:
+                    st.markdown("<br>", unsafe_allow_html=True)
+                    if st.button("📦 Prepare Export", use_container_width=True):
+                        _discard_prepared("share_export")
+                        path, mime, n_rows = export_share_table(export_format, client_filter)
+                        st.session_state["share_export"] = {
+                            "path": path,
+                            "mime": mime,
+                            "rows": n_rows,
+                            "file_name": f"share_profit_distribution_{date_class.today().isoformat()}{EXPORT_FORMATS[export_format][0]}"
+                        }
+                
+                export = st.session_state.get("share_export")
+                if export and os.path.exists(export["path"]):
+                    with open(export["path"], "rb") as f:
+                        st.download_button(
+                            label=f"📥 Download {export['file_name']} ({export['rows']:,} rows)",
+                            data=f,
+                            file_name=export["file_name"],
+                            mime=export["mime"],
+                            on_click=_discard_prepared,
+                            args=("share_export",),
+                            use_container_width=True
+                        )
+                
+                # Statements: one chart + monthly distribution page per client, zipped
+                st.markdown("#### 📄 Client Statements")
+                col1, col2 = st.columns([1, 2])
+                with col1:
+                    statement_format = st.selectbox("Statement format", list(STATEMENT_FORMATS), index=1, key="statement_format")
+                with col2:
+                    st.markdown("<br>", unsafe_allow_html=True)
+                    prepare_statements = st.button("📄 Prepare Statements", use_container_width=True)
+                if prepare_statements:
+                    _discard_prepared("statement_archive")
+                    try:
+                        with st.spinner("Rendering statements..."):
+                            path, mime, n_statements = statement_archive(statement_format, list(client_filter) or None, STATEMENT_JOBS)
+                    except RuntimeError as e:
+                        st.error(f"❌ {e}")
+                    else:
+                        st.session_state["statement_archive"] = {
+                            "path": path,
+                            "mime": mime,
+                            "count": n_statements,
+                            "file_name": f"statements_{date_class.today().isoformat()}.zip"
+                        }
+                
+                archive = st.session_state.get("statement_archive")
+                if archive and os.path.exists(archive["path"]):
+                    with open(archive["path"], "rb") as f:
+                        st.download_button(
+                            label=f"📥 Download {archive['file_name']} ({archive['count']:,} statements)",
+                            data=f,
+                            file_name=archive["file_name"],
+                            mime=archive["mime"],
+                            on_click=_discard_prepared,
+                            args=("statement_archive",),
+                            use_container_width=True
+                        )
+                
+                # Time travel: every client's position at the end of any date
+                st.markdown("#### 🕰️ Balances As Of")
+                as_of = st.date_input("As of date", value=date_class.today(), key="balances_as_of")
+                balances = balances_as_of(as_of.isoformat(), client_filter)
+                st.dataframe(
+                    with_dates(balances.assign(share=balances["share"] * 100), "join_date"),
+                    use_container_width=True,
+                    hide_index=True,
+                    column_config=column_config(
+                        money=["invested", "capital", "cumulative_gain", "balance"],
+                        percent=["share", "pct_return"],
+                        dates=["join_date"]
+                    )
                 )
+                st.caption(f"Total capital Rp {balances['capital'].sum():,.0f} · "
+                           f"total balance Rp {balances['balance'].sum():,.0f} at the end of {as_of:%d %b %Y}")
                 
                 # Additional analytics
                 with st.expander("📊 View Analytics Charts"):
@@ -902,63 +629,151 @@ def admin_panel():
                     with col1:
                         # Profit distribution by client
                         st.markdown("#### Total Profit by Client")
-                        client_totals = display_df.groupby(['Client ID', 'Client Name'])['Share Profit'].sum().reset_index()
-                        client_totals = client_totals.sort_values('Share Profit', ascending=False)
-                        
-                        fig = go.Figure(go.Bar(
-                            x=client_totals['Share Profit'],
-                            y=client_totals['Client Name'],
-                            orientation='h',
-                            marker=dict(
-                                color=client_totals['Share Profit'],
-                                colorscale='Viridis',
-                                showscale=False
-                            ),
-                            text=client_totals['Share Profit'].apply(lambda x: f"Rp {x:,.0f}"),
-                            textposition='outside',
-                            hovertemplate='<b>%{y}</b><br>Total: Rp %{x:,.0f}<extra></extra>'
-                        ))
-                        
-                        fig.update_layout(
-                            xaxis_title="Total Share Profit (Rp)",
-                            yaxis_title="Client",
-                            height=400,
-                            template="plotly_white",
-                            showlegend=False
-                        )
+                        client_totals = get_share_totals_by_client(client_filter)
                         
+                        from charts import client_totals_figure
+                        fig = client_totals_figure(client_totals)
                         st.plotly_chart(fig, use_container_width=True)
                     
                     with col2:
                         # Profit trend over time
                         st.markdown("#### Profit Trend Over Time")
-                        date_totals = display_df.groupby('Profit Date')['Share Profit'].sum().reset_index()
-                        date_totals['Profit Date'] = pd.to_datetime(date_totals['Profit Date'])
-                        date_totals = date_totals.sort_values('Profit Date')
-                        
-                        fig = go.Figure(go.Scatter(
-                            x=date_totals['Profit Date'],
-                            y=date_totals['Share Profit'],
-                            mode='lines+markers',
-                            line=dict(width=3, color='#667eea'),
-                            marker=dict(size=8, color='#667eea'),
-                            fill='tozeroy',
-                            fillcolor='rgba(102, 126, 234, 0.2)',
-                            hovertemplate='<b>Date:</b> %{x}<br><b>Total:</b> Rp %{y:,.0f}<extra></extra>'
-                        ))
-                        
-                        fig.update_layout(
-                            xaxis_title="Date",
-                            yaxis_title="Total Share Profit (Rp)",
-                            height=400,
-                            template="plotly_white",
-                            showlegend=False
-                        )
+                        date_totals = get_share_totals_by_date(client_filter)
+                        trend_dates = date_totals['profit_date'].dt.date
+                        trend_start, trend_end = date_range_slider("Trend date range", trend_dates.iloc[0], trend_dates.iloc[-1])
+                        trend_resolution = st.selectbox("Trend resolution", RESOLUTIONS, key="trend_resolution")
+                        series = chart_series(date_totals['profit_date'], date_totals['share_profit'], trend_resolution, "sum", trend_start, trend_end)
                         
+                        from charts import date_totals_figure
+                        fig = date_totals_figure(series)
                         st.plotly_chart(fig, use_container_width=True)
+                        st.caption(series_caption(series))
             else:
                 st.info("📭 No share profit data available yet.")
 
+    with tab4, perf.section("Bulk Import"):
+        st.subheader("Bulk Import")
+        st.caption("Load historical clients or daily profits from a CSV / Excel file in one transaction. "
+                   "Profit rows for dates that already exist replace the stored entry.")
+
+        import_kind = st.radio("Import type", ["profits", "clients"], horizontal=True,
+                               format_func=lambda k: "💹 Daily Profits" if k == "profits" else "👥 Clients")
+        required, optional = IMPORT_COLUMNS[import_kind]
+        st.markdown(f"**Required columns:** `{'`, `'.join(required)}` &nbsp; **Optional:** `{'`, `'.join(optional)}`")
+
+        # Shown once after a successful import; the rerun would wipe an st.success right away
+        imported = st.session_state.pop("import_result", None)
+        if imported:
+            st.success(imported)
+
+        # A new uploader key after each import clears the file, so the same rows cannot be imported twice
+        upload_key = f"import_{import_kind}_{st.session_state.get('import_uploads', 0)}"
+        upload = st.file_uploader("Upload file", type=["csv", "xlsx"], key=upload_key)
+        if upload is not None:
+            try:
+                raw_df = read_table(upload)
+            except Exception as e:
+                st.error(f"❌ Could not read file: {e}")
+            else:
+                st.markdown(f"### 👀 Preview ({len(raw_df):,} rows)")
+                st.dataframe(raw_df.head(20), use_container_width=True, hide_index=True)
+
+                _, import_errors = validate(raw_df, import_kind)
+                if import_errors:
+                    st.error("❌ Fix these problems and upload again:\n\n" + "\n".join(f"- {e}" for e in import_errors))
+                elif st.button(f"📥 Import {len(raw_df):,} rows", type="primary", use_container_width=True):
+                    with st.spinner("Importing..."):
+                        n_rows = bulk_import(raw_df, import_kind)
+                    st.session_state["import_result"] = f"✅ Imported {n_rows:,} {import_kind} from {upload.name}!"
+                    st.session_state["import_uploads"] = st.session_state.get("import_uploads", 0) + 1
+                    st.rerun()
+
+    with tab5, perf.section("Funds"):
+        st.subheader("Funds")
+        st.caption("Every fund has its own database. The rollup queries all of them in parallel.")
+        
+        # Not cached: the result key would have to cover every fund's data version
+        rollup = metrics_rollup(date_class.today().isoformat())
+        st.dataframe(
+            rollup[["fund", "total_clients", "total_invested", "total_profit", "avg_return", "mtd_profit", "ytd_profit"]],
+            use_container_width=True,
+            hide_index=True,
+            column_config=column_config(
+                money=["total_invested", "total_profit", "mtd_profit", "ytd_profit"],
+                percent=["avg_return"]
+            )
+        )
+        
+        with st.expander("➕ Add Fund"):
+            with st.form("add_fund_form"):
+                fund_name = st.text_input("Fund Name *")
+                fund_key = st.text_input("Fund Key *", help="Short id, e.g. `fund-b`; the database is stored as fund_<key>.db")
+                fund_admin = st.text_input("Admin Username *", help="The new fund's own admin login")
+                fund_password = st.text_input("Admin Password *", type="password")
+                if st.form_submit_button("💾 Add Fund", use_container_width=True):
+                    try:
+                        add_fund(fund_key.strip().lower(), fund_name.strip() or fund_key, fund_admin.strip(), fund_password)
+                    except ValueError as e:
+                        st.error(f"⚠️ {e}")
+                    else:
+                        st.success(f"✅ Fund '{fund_name or fund_key}' added! Pick it in the sidebar.")
+                        st.rerun()
+
+    # Filled in by main() once the rerun's trace is complete
+    return tab6
+
+# ----------------------- Performance Panel -----------------------
+def _enable_profiling():
+    st.session_state["perf_profile_next"] = True
+
+def performance_panel(rerun_trace):
+    """Section timings, slowest queries and optional cProfile of the current rerun"""
+    st.subheader("⏱️ Performance")
+    st.caption("Timings for the rerun that rendered this page. Cached results that were "
+               "served from the cache do not show up as sections.")
+    
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Rerun Wall Time", f"{rerun_trace.wall_s * 1000:,.0f} ms")
+    col2.metric("Queries", f"{rerun_trace.query_count:,}")
+    col3.metric("Rows Fetched", f"{rerun_trace.rows_fetched:,}")
+    
+    worker = recompute_worker(get_manager().path)
+    if worker.last_duration_s is not None:
+        st.caption(f"Last background ledger recompute: {worker.last_duration_s * 1000:,.0f} ms"
+                   + (f" (failed: {worker.last_error})" if worker.last_error else ""))
+    
+    st.markdown("### 🧩 Sections")
+    sections = pd.DataFrame(rerun_trace.sections, columns=["section", "depth", "wall_s", "queries", "rows"])
+    sections["wall_ms"] = sections["wall_s"] * 1000
+    st.dataframe(
+        sections[["section", "wall_ms", "queries", "rows"]],
+        use_container_width=True,
+        hide_index=True,
+        column_config={"wall_ms": st.column_config.NumberColumn("wall (ms)", format="%.1f")}
+    )
+    
+    st.markdown("### 🐢 Slowest Queries")
+    queries = pd.DataFrame(rerun_trace.queries, columns=["query", "seconds", "rows", "section"])
+    queries["ms"] = queries["seconds"] * 1000
+    st.dataframe(
+        queries.sort_values("ms", ascending=False).head(20)[["ms", "rows", "section", "query"]],
+        use_container_width=True,
+        hide_index=True,
+        column_config={"ms": st.column_config.NumberColumn("ms", format="%.2f")}
+    )
+    
+    st.markdown("### 🔬 cProfile")
+    st.button("🔬 Re-run this page with cProfile", on_click=_enable_profiling)
+    if rerun_trace.profile_report:
+        st.code(rerun_trace.profile_report, language=None)
+    if rerun_trace.profile_data:
+        st.download_button(
+            label="📥 Download cProfile trace (.prof)",
+            data=rerun_trace.profile_data,
+            file_name=f"rerun_{date_class.today().isoformat()}.prof",
+            mime="application/octet-stream"
+        )
+
 # ----------------------- Client Personal Dashboard -----------------------
 def client_dashboard(client_id):
     client_data = get_client_by_id(client_id)
@@ -970,8 +785,9 @@ def client_dashboard(client_id):
     st.markdown("---")
     
     # Get client-specific data
-    client_ts = get_client_timeseries(client_id)
-    profits_df = list_profits_df()
+    statement = compute_client_statement(client_id)
+    client_ts = statement["timeseries"]
+    history = statement["history"]
     
     if not client_ts or len(client_ts['dates']) == 0:
         st.info("📭 No profit data available yet. Please wait for admin to add profit entries.")
@@ -982,7 +798,7 @@ def client_dashboard(client_id):
             st.markdown(f"""
             <div class="metric-card" style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);">
                 <h3>💰 Your Investment</h3>
-                <p>Rp {client_data['invested']:,.0f}</p>
+                <p>Rp {client_data['capital']:,.0f}</p>
             </div>
             """, unsafe_allow_html=True)
         with col2:
@@ -997,15 +813,15 @@ def client_dashboard(client_id):
     # Calculate current values
     current_gain = client_ts['cumulative_gain'][-1]
     current_pct = client_ts['pct_return'][-1]
-    current_value = client_data['invested'] + current_gain
+    current_value = client_data['capital'] + current_gain
     
     # Metrics
     col1, col2, col3, col4 = st.columns(4)
     with col1:
         st.markdown(f"""
         <div class="metric-card" style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);">
-            <h3>💰 Initial Investment</h3>
-            <p>Rp {client_data['invested']:,.0f}</p>
+            <h3>💰 Capital</h3>
+            <p>Rp {client_data['capital']:,.0f}</p>
         </div>
         """, unsafe_allow_html=True)
     
@@ -1039,90 +855,75 @@ def client_dashboard(client_id):
     # Performance Chart
     st.subheader("📈 Your Investment Performance")
     
-    col1, col2 = st.columns([3, 1])
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        chart_start, chart_end = date_range_slider("Date range", client_ts['dates'][0], client_ts['dates'][-1])
     with col2:
+        resolution = st.selectbox("Resolution", RESOLUTIONS, key="performance_resolution")
+    with col3:
         chart_type = st.radio("Chart Type", ["Line", "Area"], horizontal=True)
+    series = chart_series(client_ts['dates'], client_ts['pct_return'], resolution, "last", chart_start, chart_end)
     
-    fig = go.Figure()
-    
-    if chart_type == "Area":
-        fig.add_trace(go.Scatter(
-            x=client_ts['dates'],
-            y=client_ts['pct_return'],
-            mode='lines',
-            fill='tozeroy',
-            line=dict(width=2, color='#667eea'),
-            fillcolor='rgba(102, 126, 234, 0.3)',
-            hovertemplate='<b>Date:</b> %{x}<br><b>Return:</b> %{y:.2f}%<extra></extra>'
-        ))
-    else:
-        fig.add_trace(go.Scatter(
-            x=client_ts['dates'],
-            y=client_ts['pct_return'],
-            mode='lines+markers',
-            line=dict(width=3, color='#667eea'),
-            marker=dict(size=6, color='#667eea'),
-            hovertemplate='<b>Date:</b> %{x}<br><b>Return:</b> %{y:.2f}%<extra></extra>'
-        ))
-    
-    fig.update_layout(
-        xaxis_title="Date",
-        yaxis_title="Return (%)",
-        hovermode='x',
-        template="plotly_white",
-        height=400,
-        showlegend=False
-    )
-    
+    from charts import performance_figure
+    fig = performance_figure(series, chart_type)
     st.plotly_chart(fig, use_container_width=True)
+    st.caption(series_caption(series))
+    
+    # Position at the end of any past date
+    st.subheader("🕰️ Your Balance on a Date")
+    as_of = st.date_input("As of date", value=client_ts['dates'][-1], key="client_balance_as_of")
+    position = balances_as_of(as_of.isoformat(), (client_id,))
+    if not position.empty:
+        position = position.iloc[0]
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Capital", f"Rp {position['capital']:,.0f}")
+        col2.metric("Cumulative Profit", f"Rp {position['cumulative_gain']:,.0f}")
+        col3.metric("Balance", f"Rp {position['balance']:,.0f}")
+        col4.metric("Share of Fund", f"{position['share'] * 100:.2f}%")
     
     # Profit Distribution Table
     st.markdown("---")
     st.subheader("💼 Your Profit Distribution History")
     
-    if not profits_df.empty:
-        allocations = []
-        profits_df_sorted = profits_df.sort_values("profit_date")
+    if not history.empty:
+        alloc_df = pd.DataFrame({
+            "Date": pd.to_datetime(history["profit_date"]),
+            "Total Profit": history["total_profit"],
+            "Your Share": history["share"] * 100,
+            "Your Profit": history["share_profit"],
+            "Status": np.where(history["active"], "✅ Active", "❌ Not Active"),
+        })
         
-        for _, r in profits_df_sorted.iterrows():
-            date_str = str(r["profit_date"])
-            total_profit = r["total_profit"]
-            
-            # Get allocation for this date
-            allocs = allocations_for_date(date_str)
-            client_alloc = allocs[allocs["id"] == client_id]
-            
-            if not client_alloc.empty:
-                share = client_alloc.iloc[0]["share"]
-                allocated = total_profit * share
-                active = client_alloc.iloc[0]["active"]
-                
-                allocations.append({
-                    "Date": pd.to_datetime(date_str).strftime("%d %b %Y"),
-                    "Total Profit": total_profit,
-                    "Your Share": f"{share*100:.2f}%",
-                    "Your Profit": allocated,
-                    "Status": "✅ Active" if active else "❌ Not Active"
-                })
+        st.dataframe(
+            alloc_df,
+            use_container_width=True,
+            height=400,
+            hide_index=True,
+            column_config=column_config(money=["Total Profit", "Your Profit"], percent=["Your Share"], dates=["Date"])
+        )
         
-        if allocations:
-            alloc_df = pd.DataFrame(allocations)
-            
-            # Format display
-            display_df = alloc_df.copy()
-            display_df["Total Profit"] = display_df["Total Profit"].apply(
-                lambda x: f"Rp {x:,.0f}" if x >= 0 else f"-Rp {abs(x):,.0f}"
-            )
-            display_df["Your Profit"] = display_df["Your Profit"].apply(
-                lambda x: f"Rp {x:,.0f}" if x >= 0 else f"-Rp {abs(x):,.0f}"
+        if st.button("📄 Prepare PDF Statement"):
+            try:
+                with st.spinner("Rendering statement..."):
+                    st.session_state["client_statement"] = render_statement(client_id, "pdf")
+            except RuntimeError as e:
+                st.error(f"❌ {e}")
+            else:
+                if st.session_state["client_statement"] is None:
+                    st.info("No statement available yet: you have not been active on any profit date.")
+        if st.session_state.get("client_statement"):
+            st.download_button(
+                label="📥 Download Statement (PDF)",
+                data=st.session_state["client_statement"],
+                file_name=f"statement_{date_class.today().isoformat()}.pdf",
+                mime=STATEMENT_FORMATS["pdf"],
+                on_click=lambda: st.session_state.pop("client_statement", None)
             )
-            
-            st.dataframe(display_df, use_container_width=True, height=400, hide_index=True)
-        else:
-            st.info("No profit distribution data available for your account yet.")
+    else:
+        st.info("No profit distribution data available for your account yet.")
 
 # ----------------------- Login Pages -----------------------
-def admin_login_page():
+def admin_login_page(fund):
     st.markdown("""
     <div style='text-align: center; padding: 2rem;'>
         <h1 style='color: #ffffff; font-size: 3rem;'>🔐</h1>
@@ -1136,6 +937,7 @@ def admin_login_page():
     with col2:
         with st.form("admin_login_form"):
             st.markdown("### 🔑 Administrator Login")
+            st.caption(f"Fund: {fund['name']}")
             username = st.text_input("Username", placeholder="Enter admin username")
             password = st.text_input("Password", type="password", placeholder="Enter admin password")
             submit = st.form_submit_button("🚀 Login as Admin", use_container_width=True)
@@ -1144,6 +946,7 @@ def admin_login_page():
                 if verify_admin(username, password):
                     st.session_state["user_type"] = "admin"
                     st.session_state["username"] = username
+                    st.session_state["auth_fund"] = fund["key"]
                     st.success("✅ Admin login successful! Redirecting...")
                     st.rerun()
                 else:
@@ -1153,7 +956,7 @@ def admin_login_page():
             #st.code("Username: admin\nPassword: admin123")
             #st.warning("⚠️ Change default credentials in production!")
 
-def client_login_page():
+def client_login_page(fund):
     st.markdown("""
     <div style='text-align: center; padding: 2rem;'>
         <h1 style='color: #ffffff; font-size: 3rem;'>👤</h1>
@@ -1167,6 +970,7 @@ def client_login_page():
     with col2:
         with st.form("client_login_form"):
             st.markdown("### 🔑 Client Login")
+            st.caption(f"Fund: {fund['name']}")
             
             client_id_input = st.text_input(
                 "Client ID",
@@ -1199,6 +1003,7 @@ def client_login_page():
                             st.session_state["user_type"] = "client"
                             st.session_state["client_id"] = client_id
                             st.session_state["client_name"] = client_data["name"]
+                            st.session_state["auth_fund"] = fund["key"]
                             st.success(f"✅ Welcome, {client_data['name']}! Redirecting...")
                             st.rerun()
                         else:
@@ -1228,15 +1033,38 @@ def client_login_page():
 
 # ----------------------- Main Application -----------------------
 def main():
+    st.set_page_config(
+        page_title="Investment Consortium Dashboard",
+        page_icon="💰",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+    fund = current_fund()
+    # Everything below reads and writes this fund's database
+    with use_fund(fund["key"]):
+        with perf.trace(profile=st.session_state.pop("perf_profile_next", False)) as rerun_trace:
+            perf_tab = render_page(fund)
+        if perf_tab is not None:
+            with perf_tab:
+                performance_panel(rerun_trace)
+
+def render_page(fund):
+    """Render the page for the current user in ``fund``; returns the admin Performance tab, if shown"""
     init_db()
     load_css()
+    recompute_worker(get_manager().path)
+    perf_tab = None
     
     # Initialize session state
     if "user_type" not in st.session_state:
         st.session_state["user_type"] = None
+    check_fund_login(fund)
+    
+    # Metrics are shared by the sidebar and the admin panel: compute them once per rerun
+    metrics = get_dashboard_metrics(date_class.today().isoformat()) if st.session_state["user_type"] else None
     
     # Sidebar Navigation
-    with st.sidebar:
+    with st.sidebar, perf.section("sidebar"):
         st.markdown("""
         <div style='text-align: center; padding: 1rem 0; color: white;'>
             <h1 style='color: white; font-size: 2.5rem;'>💰</h1>
@@ -1247,14 +1075,15 @@ def main():
         
         st.markdown("<br>", unsafe_allow_html=True)
         
+        fund_switcher(fund)
+        
         # Show current user status
         if st.session_state["user_type"] == "admin":
             st.success(f"✅ Logged in as Admin")
             st.markdown(f"**User:** {st.session_state.get('username', 'Admin')}")
             
             if st.button("🚪 Logout", use_container_width=True):
-                st.session_state["user_type"] = None
-                st.session_state.pop("username", None)
+                sign_out()
                 st.rerun()
                 
         elif st.session_state["user_type"] == "client":
@@ -1263,9 +1092,7 @@ def main():
             st.markdown(f"**ID:** {st.session_state.get('client_id', 'N/A')}")
             
             if st.button("🚪 Logout", use_container_width=True):
-                st.session_state["user_type"] = None
-                st.session_state.pop("client_id", None)
-                st.session_state.pop("client_name", None)
+                sign_out()
                 st.rerun()
         else:
             st.info("👋 Please login to continue")
@@ -1286,7 +1113,6 @@ def main():
         
         # Quick Stats (visible to all)
         if st.session_state["user_type"]:
-            metrics = get_dashboard_metrics()
             st.markdown("### 📊 Quick Stats")
             st.metric("Total Investors", metrics['total_clients'])
             st.metric("Total Investment", 
@@ -1296,6 +1122,10 @@ def main():
                      f"Rp {metrics['total_profit']/1000000:.1f}M" if abs(metrics['total_profit']) >= 1000000 
                      else f"Rp {metrics['total_profit']:,.0f}")
         
+        if st.session_state["user_type"] == "admin":
+            with st.expander("⚡ Cache Stats"):
+                st.dataframe(cache_stats(), use_container_width=True, hide_index=True)
+        
         st.markdown("<br><br>", unsafe_allow_html=True)
         
         # Footer
@@ -1313,9 +1143,9 @@ def main():
         login_page_type = st.session_state.get("login_page", "select")
         
         if login_page_type == "admin":
-            admin_login_page()
+            admin_login_page(fund)
         elif login_page_type == "client":
-            client_login_page()
+            client_login_page(fund)
         else:
             # Welcome page
             st.markdown("""
@@ -1354,10 +1184,16 @@ def main():
                 st.info("👈 Please select your login type from the sidebar to continue")
                 
     elif st.session_state["user_type"] == "admin":
-        admin_panel()
+        recompute_status()
+        with perf.section("admin panel"):
+            perf_tab = admin_panel(metrics)
         
     elif st.session_state["user_type"] == "client":
-        client_dashboard(st.session_state["client_id"])
+        recompute_status()
+        with perf.section("client dashboard"):
+            client_dashboard(st.session_state["client_id"])
+    
+    return perf_tab
 
 if __name__ == "__main__":
     main()
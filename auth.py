@@ -0,0 +1,7 @@
+"""Password hashing shared by the app and the schema migrations."""
+
+import hashlib
+
+
+def hash_password(password):
+    return hashlib.sha256(password.encode()).hexdigest()
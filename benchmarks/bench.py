@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the allocation and page-render hot paths.
+
+Each size in the grid is a synthetic consortium (N clients x D daily profits)
+generated reproducibly into a temporary SQLite file. Every benchmark is run
+once to warm up, then timed ``--repeat`` times; peak Python memory is measured
+in a separate run under tracemalloc. Results are written as JSON, with a
+scaling curve (client-days vs. median seconds) per benchmark.
+
+    python benchmarks/bench.py --output bench.json
+    python benchmarks/bench.py --clients 10 100 --days 30 365 --compare bench.json
+
+With ``--compare`` the run exits with status 1 when a benchmark's fastest run
+is slower than the baseline's fastest by more than ``--threshold`` and by at
+least MIN_REGRESSION_S. Timings on shared machines drift by tens of percent
+between runs, so the gate compares the fastest run rather than the median,
+divides each by a fixed reference workload timed just before it, and times a
+benchmark that looks slower again (up to CONFIRM_ROUNDS more rounds) before
+it counts as a regression.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core  # noqa: E402
+import db  # noqa: E402
+import ledger  # noqa: E402
+from importer import bulk_import  # noqa: E402
+from migrations import init_db  # noqa: E402
+
+DEFAULT_CLIENTS = [10, 100, 1000, 5000]
+DEFAULT_DAYS = [30, 365, 3650]
+# Sizes above this many client-days are skipped unless --max-cells is raised
+DEFAULT_MAX_CELLS = 2_000_000
+# Slowdowns smaller than this are timer noise, whatever the ratio
+MIN_REGRESSION_S = 0.005
+# Extra rounds of timed runs for a benchmark that looks slower than the baseline
+CONFIRM_ROUNDS = 2
+REFERENCE_REPEAT = 5
+START = date(2015, 1, 1)
+
+
+def generate(path, n_clients, n_days, seed):
+    """Write a synthetic consortium into a new database at ``path``"""
+    rng = np.random.default_rng(seed)
+    # Most clients join during the first 80% of the history, a few before it starts
+    join_offsets = rng.integers(-30, max(1, int(n_days * 0.8)), n_clients)
+    clients = pd.DataFrame({
+        "name": [f"Client {i}" for i in range(n_clients)],
+        "invested": rng.integers(10, 1000, n_clients) * 1_000_000,
+        "join_date": [(START + timedelta(days=int(d))).isoformat() for d in join_offsets],
+    })
+    profits = pd.DataFrame({
+        "profit_date": [(START + timedelta(days=d)).isoformat() for d in range(n_days)],
+        "total_profit": rng.normal(2_000_000, 5_000_000, n_days).round(2),
+    })
+    init_db(path)
+    manager = db.get_manager(path)
+    bulk_import(clients, "clients", manager)
+    bulk_import(profits, "profits", manager)
+
+
+def share_table_page():
+    """What the Share Profit tab builds: one sorted page, the summary and both analytics aggregates"""
+    ledger.query_share_page((), "profit_date", False, 100, 0)
+    ledger.share_summary(())
+    ledger.share_totals_by_client(())
+    ledger.share_totals_by_date(())
+
+
+def client_distribution_table(client_id):
+    """What client_dashboard builds: the statement and its distribution table"""
+    history = core.compute_client_statement(client_id)["history"]
+    return pd.DataFrame({
+        "Date": pd.to_datetime(history["profit_date"]),
+        "Total Profit": history["total_profit"],
+        "Your Share": history["share"] * 100,
+        "Your Profit": history["share_profit"],
+        "Status": np.where(history["active"], "✅ Active", "❌ Not Active"),
+    })
+
+
+def benchmarks(n_clients, n_days):
+    """(name, callable, work units per call) for every hot path"""
+    last_day = (START + timedelta(days=n_days - 1)).isoformat()
+    mid_day = (START + timedelta(days=n_days // 2)).isoformat()
+    client_id = max(1, n_clients // 2)
+    return [
+        ("compute_client_timeseries", core.compute_client_timeseries, n_clients * n_days),
+        ("allocations_for_date", lambda: core.allocations_for_date(last_day), n_clients),
+        ("balances_as_of", lambda: core.balances_as_of(mid_day), n_clients),
+        ("get_dashboard_metrics", lambda: core.get_dashboard_metrics(last_day), n_days),
+        ("share_table_page", share_table_page, n_clients * n_days),
+        ("client_distribution_table", lambda: client_distribution_table(client_id), n_days),
+    ]
+
+
+def reference():
+    """Fixed numpy, SQLite and pure-Python work: its timing says how fast the machine is right now"""
+    np.sort(np.random.default_rng(0).random(200_000))
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (k INTEGER, v REAL)")
+    conn.executemany("INSERT INTO t VALUES (?, ?)", ((i % 97, float(i)) for i in range(20_000)))
+    conn.execute("SELECT k, SUM(v) FROM t GROUP BY k").fetchall()
+    conn.close()
+    sum(i * i for i in range(50_000))
+
+
+def _time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def measure(func, repeat):
+    func()  # warm up: pooled connections, capital index, sqlite page cache
+    times = _time(func, repeat)
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return times, peak
+
+
+def _slowdown(before, after):
+    """Ratio of two (fastest run, reference) timings, corrected for the machine's speed when both have a reference"""
+    ratio = after[0] / before[0]
+    if before[1] and after[1]:
+        ratio *= before[1] / after[1]
+    return ratio
+
+
+def _regressed(before, after, threshold):
+    if not before or not before[0]:
+        return False
+    ratio = _slowdown(before, after)
+    return ratio > threshold and before[0] * (ratio - 1) > MIN_REGRESSION_S
+
+
+def run_size(n_clients, n_days, repeat, seed, directory, baseline=None, threshold=None):
+    """Time every benchmark on one generated size; ``baseline`` is a previous run's ``fastest_runs``"""
+    path = os.path.join(directory, f"bench_{n_clients}x{n_days}.db")
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):  # keep migration messages out of the JSON on stdout
+        generate(path, n_clients, n_days, seed)
+    setup = time.perf_counter() - start
+
+    db.DB_PATH = path
+    ledger_rows = db.run_query("SELECT COUNT(*) FROM client_ledger", fetch=True)[0][0]
+    results = {}
+    for name, func, units in benchmarks(n_clients, n_days):
+        reference_times = _time(reference, REFERENCE_REPEAT)
+        times, peak = measure(func, repeat)
+        before = (baseline or {}).get((n_clients, n_days, name))
+        for _ in range(CONFIRM_ROUNDS):
+            if not _regressed(before, (min(times), min(reference_times)), threshold):
+                break
+            reference_times += _time(reference, REFERENCE_REPEAT)
+            times += _time(func, repeat)
+        median = statistics.median(times)
+        results[name] = {
+            "median_s": median,
+            "min_s": min(times),
+            "max_s": max(times),
+            "repeat": len(times),
+            "reference_s": min(reference_times),
+            "units": units,
+            "throughput_per_s": units / median if median > 0 else None,
+            "peak_mb": peak / 2**20,
+        }
+    db.get_manager(path).close_all()
+    return {
+        "clients": n_clients,
+        "days": n_days,
+        "client_days": n_clients * n_days,
+        "ledger_rows": ledger_rows,
+        "setup_s": setup,
+        "benchmarks": results,
+    }
+
+
+def scaling_curves(sizes):
+    """Per benchmark: [client_days, median seconds] points, smallest first"""
+    curves = {}
+    for size in sorted(sizes, key=lambda s: s["client_days"]):
+        for name, result in size["benchmarks"].items():
+            curves.setdefault(name, []).append([size["client_days"], result["median_s"]])
+    return curves
+
+
+def fastest_runs(report):
+    """(clients, days, name) -> (fastest run, reference) in seconds, for every benchmark of ``report``"""
+    return {
+        (size["clients"], size["days"], name): (result["min_s"], result.get("reference_s"))
+        for size in report["sizes"] for name, result in size["benchmarks"].items()
+    }
+
+
+def compare(report, baseline, threshold):
+    """Benchmarks whose fastest run is slower than ``baseline``'s by more than ``threshold`` (a ratio), as messages"""
+    previous = fastest_runs(baseline)
+    regressions = []
+    for size in report["sizes"]:
+        for name, result in size["benchmarks"].items():
+            before = previous.get((size["clients"], size["days"], name))
+            after = result["min_s"], result.get("reference_s")
+            if _regressed(before, after, threshold):
+                regressions.append(
+                    f"{name} {size['clients']}x{size['days']}: {before[0] * 1000:.1f} ms -> {after[0] * 1000:.1f} ms "
+                    f"({_slowdown(before, after):.2f}x at equal machine speed)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark allocation and page-render hot paths")
+    parser.add_argument("--clients", type=int, nargs="+", default=DEFAULT_CLIENTS)
+    parser.add_argument("--days", type=int, nargs="+", default=DEFAULT_DAYS)
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per benchmark (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-cells", type=int, default=DEFAULT_MAX_CELLS,
+                        help="skip sizes with more client-days than this (default: %(default)s)")
+    parser.add_argument("--output", help="JSON file to write (default: stdout)")
+    parser.add_argument("--compare", help="baseline JSON file from a previous run")
+    parser.add_argument("--threshold", type=float, default=1.5,
+                        help="slowdown ratio counted as a regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    sizes = []
+    with tempfile.TemporaryDirectory(prefix="consortium_bench_") as directory:
+        for n_clients in args.clients:
+            for n_days in args.days:
+                if n_clients * n_days > args.max_cells:
+                    print(f"skip {n_clients} clients x {n_days} days (> --max-cells)", file=sys.stderr)
+                    continue
+                print(f"{n_clients} clients x {n_days} days ...", file=sys.stderr)
+                sizes.append(run_size(n_clients, n_days, args.repeat, args.seed, directory,
+                                      baseline and fastest_runs(baseline), args.threshold))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "sizes": sizes,
+        "scaling": scaling_curves(sizes),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if baseline:
+        regressions = compare(report, baseline, args.threshold)
+        for message in regressions:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
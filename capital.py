@@ -0,0 +1,62 @@
+"""
+Prefix-sum index of active capital.
+
+The total capital active on a date only changes on days with a capital flow
+(a client joining, a deposit or a withdrawal), so it is a step function.
+CapitalIndex keeps the distinct flow days sorted together with the cumulative
+net amount up to each of them; the capital active on any date is then one
+binary search, O(log C), instead of a scan of the clients and capital_events
+tables. One index is kept per database file. It is built from the
+capital_flows view together with the manager's data version, and rebuilt on
+first use after the version changes, so commits from any process (and readers
+running between a commit and its callbacks) never see a stale index.
+"""
+
+import numpy as np
+
+from db import get_manager
+from units import from_minor
+
+
+class CapitalIndex:
+    """Sorted capital flow days with the cumulative net capital (minor units) up to each"""
+
+    def __init__(self, days=(), amounts=()):
+        self.days = np.asarray(days, dtype="int64")
+        self.cumulative = np.cumsum(np.asarray(amounts, dtype="int64"))
+
+    @classmethod
+    def from_connection(cls, conn):
+        rows = conn.execute(
+            "SELECT day, SUM(amount_minor) FROM capital_flows GROUP BY day ORDER BY day").fetchall()
+        return cls([r[0] for r in rows], [r[1] for r in rows])
+
+    def active_capital_minor(self, days):
+        """Capital (minor units) active on each of ``days`` (epoch days or datetime64 values)"""
+        steps, cumulative = self.days, self.cumulative
+        days = np.asarray(days)
+        if days.dtype.kind == "M":
+            days = days.astype("datetime64[D]").astype("int64")
+        if not len(steps):
+            return np.zeros_like(days, dtype="int64")
+        idx = np.searchsorted(steps, days, side="right") - 1
+        return np.where(idx >= 0, cumulative[np.maximum(idx, 0)], 0)
+
+    def active_capital(self, days):
+        """Capital (Rupiah) active on each of ``days``"""
+        return from_minor(self.active_capital_minor(days))
+
+
+_indexes = {}
+
+
+def capital_index(manager=None):
+    """The capital index of ``manager``'s database (the default database when None)"""
+    manager = manager or get_manager()
+    # Version first: a write landing before the build only makes the next call rebuild again
+    version = manager.data_version
+    cached = _indexes.get(manager.path)
+    if cached is None or cached[0] != version:
+        with manager.connection() as conn:
+            cached = _indexes[manager.path] = version, CapitalIndex.from_connection(conn)
+    return cached[1]
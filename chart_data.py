@@ -0,0 +1,104 @@
+"""
+Chart series reduction for long histories.
+
+Charts do not need one point per profit date over several years: a browser
+chart is a few hundred pixels wide. ``chart_series`` clips a daily series to
+the selected date range and, unless the range is short enough to show in
+full, reduces it to a weekly or monthly series or to a fixed number of points
+with LTTB (Largest-Triangle-Three-Buckets), which keeps the visual shape,
+peaks and troughs of the line. Zooming into a shorter range brings back full
+daily resolution.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Target number of points per chart
+MAX_POINTS = 500
+
+RESOLUTIONS = ["Auto", "Daily", "Weekly", "Monthly", "LTTB"]
+
+_PERIODS = {"Weekly": "W", "Monthly": "M"}
+
+
+def lttb_indices(x, y, n_out):
+    """Indices of the ``n_out`` points LTTB keeps from (x, y); always keeps the first and last point"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # Buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        # Point in this bucket forming the largest triangle with the previous kept point and the next average
+        area = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(area.argmax())
+        keep[i + 1] = previous
+    return keep
+
+
+def _resample(dates, values, period, how):
+    frame = pd.DataFrame({"date": dates, "value": values})
+    groups = frame.groupby(frame["date"].dt.to_period(period), sort=True)
+    if how == "sum":
+        # Sums are labelled with the start of their period
+        reduced = groups["value"].sum()
+        return reduced.index.start_time.to_numpy(dtype="datetime64[D]"), reduced.to_numpy(dtype=float)
+    # Running values (cumulative gain, return) are sampled at the last date of each period
+    reduced = groups.last()
+    return reduced["date"].to_numpy(dtype="datetime64[D]"), reduced["value"].to_numpy(dtype=float)
+
+
+def chart_series(dates, values, resolution="Auto", how="last", start=None, end=None, max_points=MAX_POINTS):
+    """Clip a daily series to [start, end] and reduce it to about ``max_points`` for plotting.
+
+    ``how`` is "last" for running values (cumulative gain or return) and "sum"
+    for flows (daily profit), which decides how weekly / monthly buckets are
+    aggregated. "Auto" shows daily points when they fit, else the finest of
+    weekly / monthly that fits, else LTTB. Returns a dict with ``x``, ``y``,
+    the ``resolution`` used, and the plotted / total point counts.
+    """
+    dates = pd.to_datetime(pd.Series(dates)).reset_index(drop=True)
+    values = np.asarray(values, dtype=float)
+    mask = np.ones(len(dates), dtype=bool)
+    if start is not None:
+        mask &= (dates >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        mask &= (dates <= pd.Timestamp(end)).to_numpy()
+    dates, values = dates[mask].reset_index(drop=True), values[mask]
+    total = len(dates)
+
+    if resolution == "Auto":
+        span_days = (dates.iloc[-1] - dates.iloc[0]).days + 1 if total else 0
+        if total <= max_points:
+            resolution = "Daily"
+        elif span_days / 7 <= max_points:
+            resolution = "Weekly"
+        elif span_days / 31 <= max_points:
+            resolution = "Monthly"
+        else:
+            resolution = "LTTB"
+
+    if resolution in _PERIODS and total:
+        x, y = _resample(dates, values, _PERIODS[resolution], how)
+    elif resolution == "LTTB" and total > max_points:
+        x_days = dates.to_numpy(dtype="datetime64[D]")
+        keep = lttb_indices(x_days.astype("int64"), values, max_points)
+        x, y = x_days[keep], values[keep]
+    else:
+        x, y = dates.to_numpy(dtype="datetime64[D]"), values
+
+    return {"x": x, "y": y, "resolution": resolution, "points": len(x), "total": total}
@@ -0,0 +1,137 @@
+"""
+Plotly figures shared by the dashboard and the statement generator.
+
+Imported lazily by callers, only when a chart is actually drawn, so that
+loading the app or the core modules does not pay for Plotly.
+"""
+
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+PRIMARY_COLOR = "#667eea"
+
+# Above this many points traces are drawn with WebGL (Scattergl)
+WEBGL_MIN_POINTS = 1000
+# Above this many points line charts drop their markers
+MARKERS_MAX_POINTS = 200
+
+
+def _scatter(n_points):
+    """WebGL scatter for large series, SVG scatter otherwise"""
+    return go.Scattergl if n_points > WEBGL_MIN_POINTS else go.Scatter
+
+
+def performance_figure(series, chart_type="Line", height=400):
+    """Cumulative return (%) over time, from a ``chart_data.chart_series`` of one client's returns"""
+    fig = go.Figure()
+    scatter = _scatter(series["points"])
+
+    if chart_type == "Area":
+        fig.add_trace(scatter(
+            x=series['x'],
+            y=series['y'],
+            mode='lines',
+            fill='tozeroy',
+            line=dict(width=2, color=PRIMARY_COLOR),
+            fillcolor='rgba(102, 126, 234, 0.3)',
+            hovertemplate='<b>Date:</b> %{x}<br><b>Return:</b> %{y:.2f}%<extra></extra>'
+        ))
+    else:
+        fig.add_trace(scatter(
+            x=series['x'],
+            y=series['y'],
+            mode='lines+markers' if series["points"] <= MARKERS_MAX_POINTS else 'lines',
+            line=dict(width=3, color=PRIMARY_COLOR),
+            marker=dict(size=6, color=PRIMARY_COLOR),
+            hovertemplate='<b>Date:</b> %{x}<br><b>Return:</b> %{y:.2f}%<extra></extra>'
+        ))
+
+    fig.update_layout(
+        xaxis_title="Date",
+        yaxis_title="Return (%)",
+        hovermode='x',
+        template="plotly_white",
+        height=height,
+        showlegend=False
+    )
+    return fig
+
+
+def client_totals_figure(client_totals):
+    """Horizontal bar chart of total share profit per client"""
+    fig = go.Figure(go.Bar(
+        x=client_totals['share_profit'],
+        y=client_totals['client_name'],
+        orientation='h',
+        marker=dict(
+            color=client_totals['share_profit'],
+            colorscale='Viridis',
+            showscale=False
+        ),
+        texttemplate='Rp %{x:,.0f}',
+        textposition='outside',
+        hovertemplate='<b>%{y}</b><br>Total: Rp %{x:,.0f}<extra></extra>'
+    ))
+
+    fig.update_layout(
+        xaxis_title="Total Share Profit (Rp)",
+        yaxis_title="Client",
+        height=400,
+        template="plotly_white",
+        showlegend=False
+    )
+    return fig
+
+
+def date_totals_figure(series):
+    """Total share profit over time, from a ``chart_data.chart_series`` of per-date totals"""
+    fig = go.Figure(_scatter(series["points"])(
+        x=series['x'],
+        y=series['y'],
+        mode='lines+markers' if series["points"] <= MARKERS_MAX_POINTS else 'lines',
+        line=dict(width=3, color=PRIMARY_COLOR),
+        marker=dict(size=8, color=PRIMARY_COLOR),
+        fill='tozeroy',
+        fillcolor='rgba(102, 126, 234, 0.2)',
+        hovertemplate='<b>Date:</b> %{x}<br><b>Total:</b> Rp %{y:,.0f}<extra></extra>'
+    ))
+
+    fig.update_layout(
+        xaxis_title="Date",
+        yaxis_title="Total Share Profit (Rp)",
+        height=400,
+        template="plotly_white",
+        showlegend=False
+    )
+    return fig
+
+
+def statement_figure(title, series, table, chart_height=400, row_height=24):
+    """Printable statement page: the performance chart of ``series`` above a table of ``table``'s columns.
+
+    ``table`` is a DataFrame whose values are already formatted as strings.
+    """
+    table_height = row_height * (len(table) + 2)
+    fig = make_subplots(
+        rows=2, cols=1,
+        specs=[[{"type": "xy"}], [{"type": "table"}]],
+        row_heights=[chart_height, table_height],
+        vertical_spacing=0.04,
+    )
+    for trace in performance_figure(series).data:
+        fig.add_trace(trace, row=1, col=1)
+    fig.add_trace(go.Table(
+        header=dict(values=list(table.columns), fill_color=PRIMARY_COLOR, font=dict(color="white"), align="left"),
+        cells=dict(values=[table[col] for col in table.columns], align=["left"] + ["right"] * (len(table.columns) - 1),
+                   height=row_height),
+    ), row=2, col=1)
+    fig.update_layout(
+        title=title,
+        template="plotly_white",
+        height=chart_height + table_height + 140,
+        width=900,
+        showlegend=False,
+        margin=dict(t=80, b=30, l=50, r=30),
+    )
+    fig.update_yaxes(title_text="Return (%)", row=1, col=1)
+    return fig
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Headless batch runner for the consortium database.
+
+Runs the same allocation, metrics, export and statement code as the dashboard,
+without Streamlit, e.g. for nightly reconciliation from cron:
+
+    python cli.py --db data.db allocations --date 2024-06-30
+    python cli.py metrics --as-of 2024-06-30
+    python cli.py export --format csv.gz --output exports/
+    python cli.py statements --jobs 4 --output statements/
+    python cli.py statements --format pdf --jobs 8 --zip statements.zip
+    python cli.py nightly --jobs 4 --output reports/2024-06-30/
+    python cli.py --fund fund-b metrics
+    python cli.py rollup --as-of 2024-06-30 --output rollup.csv
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+from datetime import date as date_class
+
+import db
+from core import balances_as_of, get_dashboard_metrics
+from export import EXPORT_FORMATS, export_share_table
+from funds import get_fund, metrics_rollup
+from migrations import init_db
+from statements import STATEMENT_FORMATS, statement_archive, write_statements
+
+
+def client_allocations(as_of):
+    """Per-client capital, share of capital, cumulative gain, balance and return on ``as_of``"""
+    allocations = balances_as_of(as_of)
+    allocations["share_pct"] = allocations["share"] * 100
+    return allocations[["id", "name", "invested", "capital", "join_date", "active", "share_pct", "cumulative_gain",
+                        "balance", "pct_return"]]
+
+
+def run_allocations(args):
+    allocations = client_allocations(args.date)
+    if args.output:
+        allocations.to_csv(args.output, index=False)
+        print(f"Wrote {len(allocations)} client allocations to {args.output}")
+    else:
+        print(allocations.to_string(index=False))
+
+
+def run_metrics(args):
+    metrics = get_dashboard_metrics(args.as_of)
+    text = json.dumps(metrics, indent=2, default=float)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"Wrote metrics to {args.output}")
+    else:
+        print(text)
+
+
+def run_rollup(args):
+    rollup = metrics_rollup(args.as_of)
+    if args.output:
+        rollup.to_csv(args.output, index=False)
+        print(f"Wrote metrics for {len(rollup) - 1} funds to {args.output}")
+    else:
+        print(rollup.to_string(index=False))
+
+
+def _export(fmt, client_ids, directory, as_of=None):
+    os.makedirs(directory, exist_ok=True)
+    tmp_path, _, n_rows = export_share_table(fmt, client_ids, directory, as_of)
+    path = os.path.join(directory, "share_profit" + EXPORT_FORMATS[fmt][0])
+    shutil.move(tmp_path, path)
+    return path, n_rows
+
+
+def run_export(args):
+    path, n_rows = _export(args.format, tuple(args.client or ()), args.output, args.as_of)
+    print(f"Exported {n_rows} share rows to {path}")
+
+
+def run_statements(args):
+    if args.zip:
+        directory = os.path.dirname(args.zip) or "."
+        os.makedirs(directory, exist_ok=True)
+        tmp_path, _, n_statements = statement_archive(args.format, args.client or None, args.jobs, directory,
+                                                      args.as_of)
+        shutil.move(tmp_path, args.zip)
+        print(f"Wrote {n_statements} statements to {args.zip}")
+        return
+    paths = write_statements(args.output, args.client or None, args.jobs, args.format, args.as_of)
+    print(f"Wrote {len(paths)} statements to {args.output}")
+
+
+def run_nightly(args):
+    os.makedirs(args.output, exist_ok=True)
+    run_allocations(argparse.Namespace(date=args.as_of, output=os.path.join(args.output, "allocations.csv")))
+    run_metrics(argparse.Namespace(as_of=args.as_of, output=os.path.join(args.output, "metrics.json")))
+    path, n_rows = _export(args.format, (), args.output, args.as_of)
+    print(f"Exported {n_rows} share rows to {path}")
+    paths = write_statements(os.path.join(args.output, "statements"), None, args.jobs, args.statement_format,
+                             args.as_of)
+    print(f"Wrote {len(paths)} statements")
+
+
+def _date(value):
+    return date_class.fromisoformat(value)
+
+
+def build_parser():
+    today = date_class.today()
+    parser = argparse.ArgumentParser(description="Consortium batch runner")
+    parser.add_argument("--db", default=db.DB_PATH, help="SQLite database file (default: %(default)s)")
+    parser.add_argument("--fund", help="registered fund key (see funds.json); overrides --db")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("allocations", help="per-client capital, share, cumulative gain and balance on a date")
+    p.add_argument("--date", type=_date, default=today, help="YYYY-MM-DD (default: today)")
+    p.add_argument("--output", help="CSV file to write instead of printing")
+    p.set_defaults(func=run_allocations)
+
+    p = commands.add_parser("metrics", help="dashboard headline metrics as JSON")
+    p.add_argument("--as-of", type=_date, default=today, help="YYYY-MM-DD (default: today)")
+    p.add_argument("--output", help="JSON file to write instead of printing")
+    p.set_defaults(func=run_metrics)
+
+    p = commands.add_parser("rollup", help="headline metrics of every registered fund, queried in parallel")
+    p.add_argument("--as-of", type=_date, default=today, help="YYYY-MM-DD (default: today)")
+    p.add_argument("--output", help="CSV file to write instead of printing")
+    p.set_defaults(func=run_rollup)
+
+    p = commands.add_parser("export", help="export the share profit table")
+    p.add_argument("--format", choices=list(EXPORT_FORMATS), default="csv")
+    p.add_argument("--client", type=int, action="append", help="client id (repeatable; default: all)")
+    p.add_argument("--as-of", type=_date, help="leave out rows dated after YYYY-MM-DD (default: every date)")
+    p.add_argument("--output", default=".", help="output directory (default: current directory)")
+    p.set_defaults(func=run_export)
+
+    p = commands.add_parser("statements", help="per-client statements")
+    p.add_argument("--client", type=int, action="append", help="client id (repeatable; default: all)")
+    p.add_argument("--format", choices=list(STATEMENT_FORMATS), default="csv")
+    p.add_argument("--as-of", type=_date, help="leave out profit dates after YYYY-MM-DD (default: every date)")
+    p.add_argument("--jobs", type=int, default=1, help="worker processes / render tabs (default: 1)")
+    p.add_argument("--output", default="statements", help="output directory (default: %(default)s)")
+    p.add_argument("--zip", help="write a single zip archive to this path instead of a directory")
+    p.set_defaults(func=run_statements)
+
+    p = commands.add_parser("nightly", help="allocations, metrics, export and statements as of one date")
+    p.add_argument("--as-of", type=_date, default=today, help="YYYY-MM-DD (default: today)")
+    p.add_argument("--format", choices=list(EXPORT_FORMATS), default="csv", help="share export format")
+    p.add_argument("--statement-format", choices=list(STATEMENT_FORMATS), default="csv")
+    p.add_argument("--jobs", type=int, default=1, help="worker processes for statements (default: 1)")
+    p.add_argument("--output", required=True, help="output directory")
+    p.set_defaults(func=run_nightly)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    db.DB_PATH = args.db
+    try:
+        if args.fund:
+            db.DB_PATH = get_fund(args.fund)["path"]
+        init_db()
+        args.func(args)
+    except KeyError as e:
+        print(f"error: {e.args[0]}", file=sys.stderr)
+        return 1
+    except RuntimeError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,349 @@
+"""
+Data access, CRUD and allocation functions behind the dashboard.
+
+Nothing here imports Streamlit, so the same functions serve the web app (which
+wraps the read functions in its result cache), the command-line batch runner
+and any other script working on the consortium database.
+"""
+
+from datetime import datetime, timedelta
+from datetime import date as date_class
+
+import numpy as np
+import pandas as pd
+
+import ledger
+import recompute
+from allocation import capital_matrix, client_allocation, pct_return
+from auth import hash_password
+from capital import capital_index
+from db import run_query, transaction
+from migrations import DEFAULT_CLIENT_PASSWORD
+from perf import timed
+from timeseries import TimeseriesResult
+from units import day_array, from_day, from_minor, to_day, to_minor
+
+# A client's current capital: their initial investment plus every deposit and withdrawal since
+CLIENT_CAPITAL_SQL = (
+    "(invested_minor + COALESCE((SELECT SUM(amount_minor) FROM capital_events e WHERE e.client_id = clients.id), 0))"
+    " / 100.0")
+
+# ----------------------- Authentication -----------------------
+def verify_admin(username, password):
+    rows = run_query("SELECT password FROM admin_users WHERE username=?", (username,), fetch=True)
+    if rows:
+        return rows[0][0] == hash_password(password)
+    return False
+
+def verify_client(client_id, password):
+    rows = run_query("SELECT password FROM clients WHERE id=?", (client_id,), fetch=True)
+    if rows:
+        return rows[0][0] == hash_password(password)
+    return False
+
+def get_client_by_id(client_id):
+    rows = run_query(f"SELECT id, name, invested_minor / 100.0, {CLIENT_CAPITAL_SQL}, date(join_day * 86400, 'unixepoch'), note FROM clients WHERE id=?", (client_id,), fetch=True)
+    if rows:
+        return {
+            "id": rows[0][0],
+            "name": rows[0][1],
+            "invested": rows[0][2],
+            "capital": rows[0][3],
+            "join_date": rows[0][4],
+            "note": rows[0][5]
+        }
+    return None
+
+# ----------------------- CRUD operations -----------------------
+# Dates are stored as epoch days and amounts as minor units (see units.py).
+# Every write refreshes the materialized client ledger from the earliest
+# date it can affect: in the same transaction as the write itself, or right
+# after it on the background worker when one is running (see recompute.py).
+def add_client(name, invested, join_date, note="", password=""):
+    hashed_pw = hash_password(password) if password else hash_password(DEFAULT_CLIENT_PASSWORD)
+    join_day = to_day(join_date)
+    invested_minor = to_minor(invested)
+    with transaction() as conn:
+        conn.execute("INSERT INTO clients (name, invested_minor, join_day, note, password) VALUES (?, ?, ?, ?, ?)", 
+                     (name, invested_minor, join_day, note, hashed_pw))
+        recompute.schedule(conn, join_day)
+
+def update_client(client_id, name, invested, join_date, note="", password=None):
+    invested_minor, join_day = to_minor(invested), to_day(join_date)
+    with transaction() as conn:
+        old = conn.execute("SELECT invested_minor, join_day FROM clients WHERE id=?", (client_id,)).fetchone()
+        if password:
+            conn.execute("UPDATE clients SET name=?, invested_minor=?, join_day=?, note=?, password=? WHERE id=?", 
+                         (name, invested_minor, join_day, note, hash_password(password), client_id))
+        else:
+            conn.execute("UPDATE clients SET name=?, invested_minor=?, join_day=?, note=? WHERE id=?", 
+                         (name, invested_minor, join_day, note, client_id))
+        # Name, note and password changes do not affect allocations
+        if old and (old[0] != invested_minor or old[1] != join_day):
+            _check_capital_flows(conn, client_id)
+            recompute.schedule(conn, min(old[1], join_day))
+
+def delete_client(client_id):
+    with transaction() as conn:
+        flows = conn.execute("SELECT day, amount_minor FROM capital_flows WHERE client_id=?", (client_id,)).fetchall()
+        # Deletes the client's capital events too (ON DELETE CASCADE)
+        conn.execute("DELETE FROM clients WHERE id=?", (client_id,))
+        if flows:
+            recompute.schedule(conn, min(day for day, _ in flows))
+
+@timed
+def list_clients_df():
+    rows = run_query(f"SELECT id, name, invested_minor / 100.0, {CLIENT_CAPITAL_SQL}, date(join_day * 86400, 'unixepoch'), note FROM clients ORDER BY id", fetch=True)
+    return pd.DataFrame(rows, columns=["id","name","invested","capital","join_date","note"]) if rows else pd.DataFrame(columns=["id","name","invested","capital","join_date","note"])
+
+def _check_capital_flows(conn, client_id):
+    """Reject capital events dated before the client joined or withdrawing more than the client holds"""
+    join = conn.execute("SELECT join_day FROM clients WHERE id=?", (client_id,)).fetchone()
+    if join is None:
+        raise ValueError(f"Client {client_id} does not exist")
+    first_event = conn.execute("SELECT MIN(event_day) FROM capital_events WHERE client_id=?", (client_id,)).fetchone()[0]
+    if first_event is not None and first_event < join[0]:
+        raise ValueError(f"Client {client_id} has capital events before their join date")
+    balance = 0
+    for day, amount in conn.execute(
+            "SELECT day, SUM(amount_minor) FROM capital_flows WHERE client_id=? GROUP BY day ORDER BY day", (client_id,)):
+        balance += amount
+        if balance < 0:
+            raise ValueError(f"Withdrawals exceed client {client_id}'s capital on {from_day(day)}")
+
+# Deposits are positive amounts and withdrawals negative ones
+def add_capital_event(client_id, event_date, amount, note=""):
+    event_day, amount_minor = to_day(event_date), to_minor(amount)
+    if amount_minor == 0:
+        raise ValueError("Amount must not be zero")
+    with transaction() as conn:
+        conn.execute("INSERT INTO capital_events (client_id, event_day, amount_minor, note) VALUES (?, ?, ?, ?)",
+                     (client_id, event_day, amount_minor, note))
+        _check_capital_flows(conn, client_id)
+        recompute.schedule(conn, event_day)
+
+def delete_capital_event(event_id):
+    with transaction() as conn:
+        old = conn.execute("SELECT client_id, event_day, amount_minor FROM capital_events WHERE id=?", (event_id,)).fetchone()
+        conn.execute("DELETE FROM capital_events WHERE id=?", (event_id,))
+        if old:
+            _check_capital_flows(conn, old[0])
+            recompute.schedule(conn, old[1])
+
+@timed
+def list_capital_events_df(client_id=None):
+    query = ("SELECT e.id, e.client_id, c.name, date(e.event_day * 86400, 'unixepoch'), e.amount_minor / 100.0, e.note "
+             "FROM capital_events e JOIN clients c ON c.id = e.client_id")
+    params = ()
+    if client_id is not None:
+        query += " WHERE e.client_id = ?"
+        params = (client_id,)
+    rows = run_query(query + " ORDER BY e.event_day, e.id", params, fetch=True)
+    return pd.DataFrame(rows, columns=["id","client_id","name","event_date","amount","note"])
+
+def add_profit(profit_date, total_profit, note=""):
+    profit_day = to_day(profit_date)
+    with transaction() as conn:
+        conn.execute("INSERT OR REPLACE INTO profits (profit_day, total_profit_minor, note) VALUES (?, ?, ?)", 
+                     (profit_day, to_minor(total_profit), note))
+        recompute.schedule(conn, profit_day)
+
+def update_profit(profit_id, profit_date, total_profit, note=""):
+    profit_day = to_day(profit_date)
+    with transaction() as conn:
+        old = conn.execute("SELECT profit_day FROM profits WHERE id=?", (profit_id,)).fetchone()
+        conn.execute("UPDATE profits SET profit_day=?, total_profit_minor=?, note=? WHERE id=?", 
+                     (profit_day, to_minor(total_profit), note, profit_id))
+        recompute.schedule(conn, min(old[0], profit_day) if old else profit_day)
+
+def delete_profit(profit_id):
+    with transaction() as conn:
+        old = conn.execute("SELECT profit_day FROM profits WHERE id=?", (profit_id,)).fetchone()
+        conn.execute("DELETE FROM profits WHERE id=?", (profit_id,))
+        if old:
+            recompute.schedule(conn, old[0])
+
+@timed
+def list_profits_df():
+    rows = run_query("SELECT id, date(profit_day * 86400, 'unixepoch'), total_profit_minor / 100.0, note FROM profits ORDER BY profit_day", fetch=True)
+    return pd.DataFrame(rows, columns=["id","profit_date","total_profit","note"]) if rows else pd.DataFrame(columns=["id","profit_date","total_profit","note"])
+
+# ----------------------- Allocation & calculations -----------------------
+@timed
+def allocations_for_date(target_date):
+    clients = list_clients_df()
+    if clients.empty:
+        return pd.DataFrame(columns=["id","name","invested","capital","join_date","active","share","alloc_profit"])
+    clients["join_date"] = pd.to_datetime(clients["join_date"]).dt.date
+    target = datetime.strptime(target_date, "%Y-%m-%d").date() if isinstance(target_date, str) else target_date
+    # Each client's capital on the target date, not today
+    rows = run_query("SELECT client_id, SUM(amount_minor) FROM capital_flows WHERE day <= ? GROUP BY client_id",
+                     (to_day(target),), fetch=True)
+    clients["capital"] = from_minor(clients["id"].map(dict(rows)).fillna(0).to_numpy(dtype="int64"))
+    clients["active"] = clients["capital"] > 0
+    active_sum = float(capital_index().active_capital(to_day(target)))
+    if active_sum == 0:
+        clients["share"] = 0.0
+    else:
+        clients["share"] = clients["capital"] / active_sum
+        clients.loc[~clients["active"], "share"] = 0.0
+    return clients
+
+@timed
+def balances_as_of(as_of, client_ids=()):
+    """Every client's capital, share, cumulative gain, balance and return at the end of ``as_of``.
+
+    Read from the nearest monthly checkpoint plus a bounded replay after it
+    (see ledger.state_as_of), whatever the length of the history.
+    """
+    as_of_day = to_day(as_of)
+    columns = ["id","name","invested","join_date","capital","active","share","cumulative_gain","balance","pct_return"]
+    clients = list_clients_df()
+    if client_ids:
+        clients = clients[clients["id"].isin(client_ids)]
+    if clients.empty:
+        return pd.DataFrame(columns=columns)
+    state = ledger.state_as_of(as_of_day, tuple(client_ids)).set_index("client_id")
+    clients = clients.reset_index(drop=True)
+    clients["capital"] = from_minor(clients["id"].map(state["capital_minor"]).fillna(0).to_numpy(dtype="int64"))
+    clients["cumulative_gain"] = clients["id"].map(state["cumulative_profit"]).fillna(0.0).to_numpy(dtype=float)
+    clients["active"] = clients["capital"] > 0
+    active_sum = float(capital_index().active_capital(as_of_day))
+    clients["share"] = np.where(clients["active"] & (active_sum > 0), clients["capital"] / (active_sum or 1), 0.0)
+    clients["balance"] = clients["capital"] + clients["cumulative_gain"]
+    clients["pct_return"] = pct_return(clients["cumulative_gain"].to_numpy(), clients["capital"].to_numpy())
+    return clients[columns]
+
+def _client_result(client, dates, cumulative_gain, capital):
+    gains = np.asarray(cumulative_gain, dtype=float)
+    capital = np.asarray(capital, dtype=float)
+    return {
+        "name": client["name"],
+        "invested": client["invested"],
+        "join_date": client["join_date"],
+        "dates": dates,
+        "capital": capital.tolist(),
+        "cumulative_gain": gains.tolist(),
+        "pct_return": pct_return(gains, capital).tolist()
+    }
+
+@timed
+def compute_client_timeseries():
+    """Every client's capital and cumulative gain series as a columnar TimeseriesResult, read from the materialized ledger"""
+    profits = list_profits_df()
+    clients = list_clients_df()
+    if profits.empty or clients.empty:
+        return TimeseriesResult.empty(), profits, clients
+    profits["profit_date"] = pd.to_datetime(profits["profit_date"]).dt.date
+    clients["join_date"] = pd.to_datetime(clients["join_date"]).dt.date
+
+    profits = profits.sort_values("profit_date")
+    days = pd.to_datetime(profits["profit_date"]).to_numpy(dtype="datetime64[D]")
+    client_ids = clients["id"].to_numpy(dtype="int64")
+    rows = ledger.read_ledger()
+    row_days = rows["profit_date"].to_numpy(dtype="datetime64[D]")
+    row_ids = rows["client_id"].to_numpy(dtype="int64")
+    r = np.minimum(np.searchsorted(client_ids, row_ids), len(client_ids) - 1)
+    c = np.minimum(np.searchsorted(days, row_days), len(days) - 1)
+    # Skip rows a pending background refresh has not removed yet
+    valid = (client_ids[r] == row_ids) & (days[c] == row_days)
+    r, c = r[valid], c[valid]
+
+    capital = np.zeros((len(client_ids), len(days)))
+    capital[r, c] = rows["capital"].to_numpy()[valid]
+    # Clients have no ledger rows while they hold no capital: carry gains forward, zero before joining
+    cum_gain = np.full(capital.shape, np.nan)
+    cum_gain[r, c] = rows["cumulative_profit"].to_numpy()[valid]
+    last = np.maximum.accumulate(np.where(np.isnan(cum_gain), 0, np.arange(len(days))), axis=1)
+    cum_gain = np.nan_to_num(np.take_along_axis(cum_gain, last, axis=1))
+
+    return TimeseriesResult(days, clients[["id", "name", "invested", "join_date"]], capital, cum_gain), profits, clients
+
+def active_capital_by_date(as_of=None):
+    """Every profit entry (oldest first, up to ``as_of`` if given) with the total invested capital active on that date"""
+    where, params = (" WHERE profit_day <= ?", (to_day(as_of),)) if as_of is not None else ("", ())
+    rows = run_query("SELECT profit_day, total_profit_minor FROM profits" + where + " ORDER BY profit_day",
+                     params, fetch=True)
+    profits = pd.DataFrame(rows, columns=["profit_date", "total_profit"])
+    # One binary search per date in the capital prefix-sum index, no clients table scan
+    profits["active_capital"] = capital_index().active_capital(profits["profit_date"].to_numpy(dtype="int64"))
+    profits["profit_date"] = day_array(profits["profit_date"])
+    profits["total_profit"] = from_minor(profits["total_profit"])
+    return profits
+
+@timed
+def compute_client_statement(client_id, as_of=None):
+    """Chart series and profit distribution history for one client, computed in a single pass.
+
+    Only the active-capital total per date and the client's own row are needed,
+    so one investor's dashboard does not pay for every other investor's timeseries.
+    With ``as_of``, profit dates after it are left out.
+    """
+    client = get_client_by_id(client_id)
+    if not client:
+        return None
+    client["join_date"] = pd.to_datetime(client["join_date"]).date()
+    profits = active_capital_by_date(as_of)
+    if profits.empty:
+        return {"timeseries": None, "history": pd.DataFrame(columns=["profit_date", "total_profit", "share", "share_profit", "active"])}
+
+    profit_days = profits["profit_date"].to_numpy(dtype="datetime64[D]")
+    dates = profit_days.astype(object).tolist()
+    # The client's own capital on each profit date, from their flows alone
+    flows = run_query("SELECT day, SUM(amount_minor) FROM capital_flows WHERE client_id=? GROUP BY day ORDER BY day",
+                      (client_id,), fetch=True)
+    flows = np.array(flows, dtype="int64").reshape(-1, 2)
+    capital = from_minor(capital_matrix(
+        profit_days.astype("int64"), flows[:, 0], np.zeros(len(flows), dtype=int), flows[:, 1], 1)[:, 0])
+    active, share, daily_gain, cum_gain = client_allocation(
+        profits["total_profit"].to_numpy(dtype=float),
+        profits["active_capital"].to_numpy(dtype=float),
+        capital,
+    )
+    history = pd.DataFrame({
+        "profit_date": dates,
+        "total_profit": profits["total_profit"],
+        "share": share,
+        "share_profit": daily_gain,
+        "active": active,
+    })
+    return {"timeseries": _client_result(client, dates, cum_gain, capital), "history": history}
+
+# ----------------------- Dashboard Metrics -----------------------
+@timed
+def get_dashboard_metrics(as_of=None, last_n_days=30):
+    """Headline totals plus MTD / YTD / last-N-days profit as of ``as_of`` (today when None), from one aggregate query.
+
+    Rows dated after ``as_of`` are left out of every figure, the totals included.
+    """
+    as_of = date_class.fromisoformat(as_of) if isinstance(as_of, str) else (as_of or date_class.today())
+    periods = {
+        "mtd": to_day(as_of.replace(day=1)),
+        "ytd": to_day(as_of.replace(month=1, day=1)),
+        "last_n": to_day(as_of - timedelta(days=last_n_days - 1)),
+        "as_of": to_day(as_of),
+    }
+    # The sums are answered from the covering indexes on clients, capital_events and profits
+    row = run_query("""
+        SELECT
+            (SELECT COUNT(*) FROM clients WHERE join_day <= :as_of),
+            (SELECT COALESCE(SUM(amount_minor), 0) FROM capital_flows WHERE day <= :as_of),
+            COALESCE(SUM(total_profit_minor), 0),
+            COALESCE(SUM(CASE WHEN profit_day >= :mtd THEN total_profit_minor END), 0),
+            COALESCE(SUM(CASE WHEN profit_day >= :ytd THEN total_profit_minor END), 0),
+            COALESCE(SUM(CASE WHEN profit_day >= :last_n THEN total_profit_minor END), 0)
+        FROM profits WHERE profit_day <= :as_of""", periods, fetch=True)[0]
+    total_clients = row[0]
+    total_invested, total_profit, mtd_profit, ytd_profit, last_n_profit = (from_minor(v) for v in row[1:])
+    avg_return = (total_profit / total_invested * 100) if total_invested > 0 else 0
+    
+    return {
+        "total_clients": total_clients,
+        "total_invested": total_invested,
+        "total_profit": total_profit,
+        "avg_return": avg_return,
+        "mtd_profit": mtd_profit,
+        "ytd_profit": ytd_profit,
+        "last_n_days": last_n_days,
+        "last_n_days_profit": last_n_profit
+    }
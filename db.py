@@ -0,0 +1,257 @@
+"""
+SQLite connection layer.
+
+Connections are pooled per database file and reused across queries and
+Streamlit sessions instead of being opened and closed for every statement.
+Each pooled connection runs in WAL mode with tuned PRAGMAs, and keeps
+sqlite3's prepared-statement cache warm between calls.
+
+Writes through a manager are serialized by a process-level write lock, and
+run any after-commit callbacks registered during the transaction while the
+lock is still held. The manager's data version changes with every commit to
+the file, from this process or any other (it is SQLite's ``PRAGMA
+data_version`` on a connection that never writes); result caches key on it
+and drop their entries when it changes.
+
+Pooled connections count and time every statement they execute, whether it
+comes from ``run_query``, a ``transaction`` or a borrowed ``connection``, in the
+manager's stats and the active perf trace.
+
+The module-level helpers work on the "default" database: DB_PATH, unless
+``use_database`` routes the current thread to another file (one per fund, see
+funds.py). Each file has its own manager, pool, write lock and data version.
+"""
+
+import contextvars
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from perf import record_query, record_rows
+
+DB_PATH = "data.db"
+
+POOL_SIZE = 8
+STATEMENT_CACHE_SIZE = 256
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",      # ~16 MB page cache
+    "PRAGMA mmap_size=134217728",    # 128 MB memory-mapped I/O
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+)
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor that adds the rows it fetches to its query's perf record"""
+
+    record = None
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        record_rows(self.record, len(rows), time.perf_counter() - start)
+        return rows
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        record_rows(self.record, len(rows), time.perf_counter() - start)
+        return rows
+
+
+class TracedConnection(sqlite3.Connection):
+    """Connection that counts every statement in its manager's stats and reports it to the perf trace"""
+
+    manager = None
+
+    def _traced(self, method, sql, args):
+        start = time.perf_counter()
+        cursor = method(self.cursor(TracedCursor), sql, *args)
+        if self.manager is not None:
+            self.manager._count("queries")
+            cursor.record = record_query(sql, time.perf_counter() - start)
+        return cursor
+
+    def execute(self, sql, parameters=()):
+        return self._traced(sqlite3.Cursor.execute, sql, (parameters,))
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._traced(sqlite3.Cursor.executemany, sql, (seq_of_parameters,))
+
+
+class ConnectionManager:
+    """Thread-safe pool of SQLite connections to a single database file"""
+
+    def __init__(self, path, pool_size=POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+        self._lock = threading.Lock()
+        self.write_lock = threading.RLock()
+        self._local = threading.local()
+        self._stats = {"connections_opened": 0, "connections_closed": 0, "queries": 0, "writes": 0}
+        self._watch = None
+        self._watch_opened = 0
+        self._watch_lock = threading.Lock()
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    @property
+    def data_version(self):
+        """Value that changes whenever a write is committed to the database, by any connection or process"""
+        with self._watch_lock:
+            if self._watch is None:
+                # Never writes, so its PRAGMA data_version sees every commit, the pool's included
+                self._watch = sqlite3.connect(self.path, check_same_thread=False)
+                self._watch_opened += 1
+            # PRAGMA data_version is only comparable on one connection: tell reopened ones apart
+            return self._watch_opened, self._watch.execute("PRAGMA data_version").fetchone()[0]
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=5.0,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            factory=TracedConnection,
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        conn.manager = self
+        self._count("connections_opened")
+        return conn
+
+    def _close(self, conn):
+        conn.close()
+        self._count("connections_closed")
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection; it is returned to the pool afterwards"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                self._close(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Borrow a connection and commit everything executed on it as one transaction"""
+        with self.write_lock, self.connection() as conn:
+            self._local.callbacks = callbacks = []
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                self._local.callbacks = None
+            self._count("writes")
+            for callback in callbacks:
+                callback()
+
+    def on_commit(self, callback):
+        """Run ``callback`` once the current thread's open transaction commits"""
+        callbacks = getattr(self._local, "callbacks", None)
+        if callbacks is None:
+            raise RuntimeError("on_commit() called outside of a transaction")
+        callbacks.append(callback)
+
+    def run_query(self, query, params=(), fetch=False):
+        if fetch:
+            with self.connection() as conn:
+                return conn.execute(query, params).fetchall()
+        with self.write_lock, self.connection() as conn:
+            conn.execute(query, params)
+            conn.commit()
+            self._count("writes")
+
+    def close_all(self):
+        """Close every idle pooled connection (e.g. before replacing the database file)"""
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        with self._watch_lock:
+            if self._watch is not None:
+                self._watch.close()
+                self._watch = None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["idle_connections"] = self._idle.qsize()
+        stats["data_version"] = self.data_version
+        return stats
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+_current_path = contextvars.ContextVar("database_path", default=None)
+
+
+def current_path():
+    """Database file used by default in this context: set by ``use_database``, else DB_PATH"""
+    return _current_path.get() or DB_PATH
+
+
+@contextmanager
+def use_database(path):
+    """Make ``path`` the default database for the enclosed block, in this thread only"""
+    token = _current_path.set(path)
+    try:
+        yield
+    finally:
+        _current_path.reset(token)
+
+
+def get_manager(path=None):
+    """Return the process-wide connection manager for ``path`` (defaults to ``current_path()``)"""
+    path = path or current_path()
+    with _managers_lock:
+        manager = _managers.get(path)
+        if manager is None:
+            manager = _managers[path] = ConnectionManager(path)
+        return manager
+
+
+def run_query(query, params=(), fetch=False):
+    return get_manager().run_query(query, params, fetch)
+
+
+def transaction():
+    """Transaction on the default database (see ConnectionManager.transaction)"""
+    return get_manager().transaction()
+
+
+def on_commit(callback):
+    """Run ``callback`` after the current transaction on the default database commits"""
+    get_manager().on_commit(callback)
+
+
+def data_version():
+    """Data version of the default database"""
+    return get_manager().data_version
+
+
+def connection_stats():
+    """Connection and query counters of the default database"""
+    return get_manager().stats()
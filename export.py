@@ -0,0 +1,94 @@
+"""
+Streaming exports of the share distribution.
+
+Rows are streamed from the client ledger in chunks and written straight to
+the output file, so exporting a fund's full history uses bounded memory.
+Nothing is built until an export is actually requested.
+"""
+
+import csv
+import gzip
+import io
+import os
+import tempfile
+
+from allocation import SHARE_LEDGER_COLUMNS, SHARE_LEDGER_LABELS
+from ledger import iter_share_rows
+from units import to_day
+
+# format -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "csv.gz": (".csv.gz", "application/gzip"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+HEADER = [SHARE_LEDGER_LABELS[col] for col in SHARE_LEDGER_COLUMNS]
+
+
+def _write_csv(fileobj, chunks):
+    text = io.TextIOWrapper(fileobj, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow(HEADER)
+    n_rows = 0
+    for rows in chunks:
+        writer.writerows(rows)
+        n_rows += len(rows)
+    text.flush()
+    text.detach()
+    return n_rows
+
+
+def _write_parquet(path, chunks):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet export requires pyarrow: pip install pyarrow") from e
+
+    schema = pa.schema([
+        ("Client ID", pa.int64()),
+        ("Client Name", pa.string()),
+        ("Profit Date", pa.string()),
+        ("Capital", pa.float64()),
+        ("Share (%)", pa.float64()),
+        ("Daily Profit", pa.float64()),
+        ("Share Profit", pa.float64()),
+        ("Cumulative Profit", pa.float64()),
+        ("Total Balance", pa.float64()),
+    ])
+    n_rows = 0
+    with pq.ParquetWriter(path, schema, compression="snappy") as writer:
+        for rows in chunks:
+            columns = list(zip(*rows))
+            writer.write_batch(pa.record_batch(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema))
+            n_rows += len(rows)
+    return n_rows
+
+
+def write_share_export(path, fmt="csv", client_ids=(), chunk_size=10000, as_of=None):
+    """Stream the share table (optionally filtered to ``client_ids`` and dates up to ``as_of``) to ``path``; returns the row count"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {', '.join(EXPORT_FORMATS)}")
+    chunks = iter_share_rows(client_ids, chunk_size, to_day(as_of) if as_of is not None else None)
+    if fmt == "parquet":
+        return _write_parquet(path, chunks)
+    if fmt == "csv.gz":
+        with gzip.open(path, "wb") as fileobj:
+            return _write_csv(fileobj, chunks)
+    with open(path, "wb") as fileobj:
+        return _write_csv(fileobj, chunks)
+
+
+def export_share_table(fmt="csv", client_ids=(), directory=None, as_of=None):
+    """Export to a new temporary file; returns (path, mime type, row count)"""
+    extension, mime = EXPORT_FORMATS[fmt]
+    fd, path = tempfile.mkstemp(prefix="share_profit_", suffix=extension, dir=directory)
+    os.close(fd)
+    try:
+        n_rows = write_share_export(path, fmt, client_ids, as_of=as_of)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, mime, n_rows
@@ -0,0 +1,46 @@
+"""
+Shared table formatting for st.dataframe.
+
+Numeric columns stay numeric; currency, percentage and date display formats
+are applied by the browser through ``st.column_config`` instead of building
+formatted string copies with a Python call per cell. Sorting in the table
+therefore works on the real numbers.
+"""
+
+import pandas as pd
+import streamlit as st
+
+MONEY_FORMAT = "Rp %,.0f"
+PERCENT_FORMAT = "%.2f%%"
+DATE_FORMAT = "DD MMM YYYY"
+
+
+def money_column(label=None, **kwargs):
+    return st.column_config.NumberColumn(label, format=MONEY_FORMAT, **kwargs)
+
+
+def percent_column(label=None, **kwargs):
+    """Column of percentages already scaled to 0-100"""
+    return st.column_config.NumberColumn(label, format=PERCENT_FORMAT, **kwargs)
+
+
+def date_column(label=None, **kwargs):
+    return st.column_config.DateColumn(label, format=DATE_FORMAT, **kwargs)
+
+
+def column_config(money=(), percent=(), dates=()):
+    """column_config mapping for the given money, percentage and date columns"""
+    config = {}
+    config.update({col: money_column() for col in money})
+    config.update({col: percent_column() for col in percent})
+    config.update({col: date_column() for col in dates})
+    return config
+
+
+def with_dates(df, *columns):
+    """Copy of ``df`` with ISO date strings parsed (vectorized) so DateColumn can format them"""
+    df = df.copy()
+    for col in columns:
+        df[col] = pd.to_datetime(df[col])
+    return df
+
@@ -0,0 +1,123 @@
+"""
+Fund registry and routing.
+
+Each consortium (fund) lives in its own SQLite file, so funds never share a
+write lock, connection pool, capital index, recompute worker or cache entry.
+The registry is a small JSON file listing every fund's key, display name and
+database path; without one there is a single default fund on ``db.DB_PATH``,
+which is how existing single-fund installs keep working.
+
+``use_fund`` routes the module-level database helpers (and therefore all of
+core.py) to one fund for the current thread. Cross-fund rollups run the same
+function on every fund in a thread pool, one fund per task, and merge the
+results; sqlite3 releases the GIL while a query runs, so shards are queried
+in parallel.
+"""
+
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pandas as pd
+
+import db
+from auth import hash_password
+from core import get_dashboard_metrics
+from migrations import DEFAULT_ADMIN, init_db
+
+FUNDS_PATH = "funds.json"
+DEFAULT_FUND = "default"
+
+# Metrics that add up across funds; avg_return is recomputed from the totals
+_SUMMED_METRICS = ["total_clients", "total_invested", "total_profit", "mtd_profit", "ytd_profit", "last_n_days_profit"]
+
+_KEY_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]*$")
+_registry_lock = threading.Lock()
+
+
+def list_funds():
+    """Registered funds as dicts with ``key``, ``name`` and ``path``, in registry order"""
+    if not os.path.exists(FUNDS_PATH):
+        return [{"key": DEFAULT_FUND, "name": "Default Fund", "path": db.DB_PATH}]
+    with open(FUNDS_PATH, encoding="utf-8") as f:
+        return json.load(f)["funds"]
+
+
+def get_fund(key):
+    """The registered fund ``key``; raises KeyError if there is none"""
+    for fund in list_funds():
+        if fund["key"] == key:
+            return fund
+    raise KeyError(f"Unknown fund: {key}")
+
+
+def _set_admin(path, username, password):
+    """Make ``username`` an admin of the fund database at ``path``, dropping the seeded default admin"""
+    default_username, default_password = DEFAULT_ADMIN
+    with db.get_manager(path).transaction() as conn:
+        conn.execute("DELETE FROM admin_users WHERE username = ? AND password = ?",
+                     (default_username, hash_password(default_password)))
+        conn.execute("INSERT OR REPLACE INTO admin_users (username, password) VALUES (?, ?)",
+                     (username, hash_password(password)))
+
+
+def add_fund(key, name, admin_username, admin_password, path=None):
+    """Register a new fund with its own database file (``fund_<key>.db`` by default) and create its schema.
+
+    The fund gets ``admin_username`` as its admin instead of the default credentials.
+    """
+    if not _KEY_PATTERN.match(key):
+        raise ValueError("Fund key must be lowercase letters, digits, '-' or '_'")
+    if not admin_username or not admin_password:
+        raise ValueError("A new fund needs an admin username and password")
+    with _registry_lock:
+        funds = list_funds()
+        path = path or f"fund_{key}.db"
+        if any(fund["key"] == key for fund in funds):
+            raise ValueError(f"Fund '{key}' already exists")
+        if any(os.path.abspath(fund["path"]) == os.path.abspath(path) for fund in funds):
+            raise ValueError(f"Database {path} is already used by another fund")
+        init_db(path)
+        _set_admin(path, admin_username, admin_password)
+        fund = {"key": key, "name": name, "path": path}
+        tmp_path = FUNDS_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"funds": funds + [fund]}, f, indent=2)
+        os.replace(tmp_path, FUNDS_PATH)
+    return fund
+
+
+@contextmanager
+def use_fund(key):
+    """Route the default-database helpers to fund ``key`` for the enclosed block (this thread only)"""
+    path = get_fund(key)["path"]
+    init_db(path)
+    with db.use_database(path):
+        yield
+
+
+def _run_on_fund(key, func, args):
+    with use_fund(key):
+        return func(*args)
+
+
+def map_funds(func, *args, keys=None, jobs=None):
+    """``func(*args)`` on every fund (or ``keys``), one thread per fund; returns {fund key: result}"""
+    keys = keys or [fund["key"] for fund in list_funds()]
+    with ThreadPoolExecutor(max_workers=jobs or len(keys)) as pool:
+        futures = {key: pool.submit(_run_on_fund, key, func, args) for key in keys}
+        return {key: future.result() for key, future in futures.items()}
+
+
+def metrics_rollup(as_of=None, keys=None):
+    """Headline metrics of every fund plus a combined "All funds" row, queried in parallel"""
+    names = {fund["key"]: fund["name"] for fund in list_funds()}
+    rows = [{"fund": names[key], **metrics} for key, metrics in map_funds(get_dashboard_metrics, as_of, keys=keys).items()]
+    total = {col: sum(row[col] for row in rows) for col in _SUMMED_METRICS}
+    total["avg_return"] = total["total_profit"] / total["total_invested"] * 100 if total["total_invested"] > 0 else 0
+    total["last_n_days"] = rows[0]["last_n_days"]
+    rows.append({"fund": "All funds", **total})
+    return pd.DataFrame(rows, columns=list(rows[0]))
@@ -0,0 +1,132 @@
+"""
+Bulk import of historical clients and daily profits.
+
+Uploaded CSV / Excel tables are validated with vectorized pandas checks and
+written with ``executemany`` in a single transaction. Derived allocation data
+(the client ledger) is refreshed once for the whole batch,
+from the earliest imported date, instead of once per row.
+"""
+
+import os
+
+import pandas as pd
+
+import recompute
+from auth import hash_password
+from db import get_manager
+from migrations import DEFAULT_CLIENT_PASSWORD
+from units import EPOCH, MINOR_UNITS
+
+# kind -> (required columns, optional columns)
+IMPORT_COLUMNS = {
+    "clients": (["name", "invested", "join_date"], ["note", "password"]),
+    "profits": (["profit_date", "total_profit"], ["note"]),
+}
+
+
+def read_table(source, file_name=None):
+    """Read a CSV or Excel file (path or file-like upload) into a DataFrame of strings"""
+    file_name = file_name or getattr(source, "name", None) or str(source)
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension in (".xlsx", ".xls"):
+        try:
+            return pd.read_excel(source, dtype=str)
+        except ImportError as e:
+            raise RuntimeError("Excel import requires openpyxl: pip install openpyxl") from e
+    return pd.read_csv(source, dtype=str, keep_default_na=False)
+
+
+def _epoch_days(values):
+    """Vectorized epoch days of a date column; NaN where the date is invalid"""
+    dates = pd.to_datetime(values, errors="coerce", format="mixed")
+    return (dates - pd.Timestamp(EPOCH)).dt.days
+
+
+def validate(df, kind):
+    """Normalize and validate an import table.
+
+    Returns ``(rows, errors)``: ``rows`` holds the storage-encoded columns
+    (epoch days, minor units) ready for insertion; ``errors`` lists problems,
+    each naming the offending file rows (1-based, after the header).
+    """
+    required, optional = IMPORT_COLUMNS[kind]
+    df = df.rename(columns=lambda c: str(c).strip().lower().replace(" ", "_"))
+    missing = [col for col in required if col not in df.columns]
+    if missing:
+        return None, [f"Missing required column(s): {', '.join(missing)}"]
+
+    rows = pd.DataFrame(index=df.index)
+    for col in optional:
+        rows[col] = df[col].fillna("").astype(str).str.strip() if col in df.columns else ""
+
+    date_col, amount_col = ("join_date", "invested") if kind == "clients" else ("profit_date", "total_profit")
+    days = _epoch_days(df[date_col])
+    amounts = pd.to_numeric(df[amount_col], errors="coerce")
+
+    checks = {
+        f"invalid {date_col}": days.isna(),
+        f"invalid {amount_col}": amounts.isna(),
+    }
+    if kind == "clients":
+        rows["name"] = df["name"].fillna("").astype(str).str.strip()
+        checks["empty name"] = rows["name"] == ""
+        checks["invested must be greater than 0"] = amounts.notna() & (amounts <= 0)
+    else:
+        checks["duplicate profit_date in file"] = days.notna() & days.duplicated(keep=False)
+
+    errors = []
+    for message, mask in checks.items():
+        if mask.any():
+            line_numbers = (df.index[mask] + 1).tolist()
+            shown = ", ".join(map(str, line_numbers[:10])) + (" ..." if len(line_numbers) > 10 else "")
+            errors.append(f"{message} ({int(mask.sum())} row(s): {shown})")
+    if errors:
+        return None, errors
+
+    rows[date_col.replace("_date", "_day")] = days.astype("int64")
+    rows[f"{amount_col}_minor"] = (amounts * MINOR_UNITS).round().astype("int64")
+    return rows, []
+
+
+def _write(kind, rows, manager):
+    with manager.transaction() as conn:
+        if kind == "clients":
+            default_password = hash_password(DEFAULT_CLIENT_PASSWORD)
+            passwords = [hash_password(p) if p else default_password for p in rows["password"]]
+            conn.executemany(
+                "INSERT INTO clients (name, invested_minor, join_day, note, password) VALUES (?, ?, ?, ?, ?)",
+                zip(rows["name"], rows["invested_minor"].tolist(), rows["join_day"].tolist(),
+                    rows["note"], passwords))
+            since_day = int(rows["join_day"].min())
+        else:
+            # Same INSERT OR REPLACE semantics as add_profit: an existing date is overwritten
+            conn.executemany(
+                "INSERT OR REPLACE INTO profits (profit_day, total_profit_minor, note) VALUES (?, ?, ?)",
+                zip(rows["profit_day"].tolist(), rows["total_profit_minor"].tolist(), rows["note"]))
+            since_day = int(rows["profit_day"].min())
+        recompute.schedule(conn, since_day, manager)
+
+
+def bulk_import(df, kind, manager=None):
+    """Validate and import a clients or profits table in one transaction; returns the row count.
+
+    Raises ValueError listing every validation problem if the table is invalid,
+    in which case nothing is written.
+    """
+    if kind not in IMPORT_COLUMNS:
+        raise ValueError(f"Unknown import kind {kind!r}; expected 'clients' or 'profits'")
+    rows, errors = validate(df, kind)
+    if errors:
+        raise ValueError("; ".join(errors))
+    if rows.empty:
+        return 0
+    _write(kind, rows, manager or get_manager())
+    return len(rows)
+
+
+def import_clients(df, manager=None):
+    return bulk_import(df, "clients", manager)
+
+
+def import_profits(df, manager=None):
+    return bulk_import(df, "profits", manager)
@@ -0,0 +1,374 @@
+"""
+Materialized per-client ledger.
+
+``client_ledger`` holds one row per (client, profit date) on which the client
+has capital in the fund: their capital, their share of that day's profit and
+their cumulative gain. The CRUD functions refresh it incrementally inside
+their own transaction, so an edit dated D never recomputes rows long before D.
+
+``capital_checkpoints`` persists every client's capital and cumulative gain at
+the start of each month. A refresh for a change dated D resumes from the
+nearest checkpoint on or before D, so it replays at most a month of capital
+flows and profits before D instead of the whole history. Pages read these
+precomputed rows, so their cost does not grow with the length of the history.
+"""
+
+import numpy as np
+import pandas as pd
+
+from allocation import SHARE_LEDGER_COLUMNS, allocate_capital, capital_matrix
+from db import get_manager
+from units import day_array, from_minor
+
+LEDGER_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS client_ledger (
+    client_id INTEGER NOT NULL,
+    profit_day INTEGER NOT NULL,
+    capital REAL NOT NULL,
+    share REAL NOT NULL,
+    share_profit REAL NOT NULL,
+    cumulative_profit REAL NOT NULL,
+    PRIMARY KEY (client_id, profit_day)
+) WITHOUT ROWID"""
+
+LEDGER_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_client_ledger_date ON client_ledger(profit_day)"
+
+LEDGER_SHARE_PROFIT_INDEX_SQL = (
+    "CREATE INDEX IF NOT EXISTS idx_client_ledger_share_profit ON client_ledger(share_profit)")
+
+# State of every client with capital or gains before checkpoint_day (the 1st of a month)
+CHECKPOINT_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS capital_checkpoints (
+    checkpoint_day INTEGER NOT NULL,
+    client_id INTEGER NOT NULL,
+    capital_minor INTEGER NOT NULL,
+    cumulative_profit REAL NOT NULL,
+    PRIMARY KEY (checkpoint_day, client_id)
+) WITHOUT ROWID"""
+
+# Earliest day from which the ledger is stale, while a background refresh is pending (see recompute.py)
+DIRTY_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS ledger_dirty (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    since_day INTEGER NOT NULL
+)"""
+
+
+# Counts the changes recorded by mark_dirty, so a refresh planned outside the write lock can tell it went stale
+VERSION_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS ledger_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+)"""
+
+
+def month_starts(first_day, last_day):
+    """Epoch days of the 1st of every month in (first_day, last_day]"""
+    first = (np.datetime64(int(first_day), "D").astype("datetime64[M]") + 1).astype("datetime64[D]")
+    months = np.arange(first.astype("datetime64[M]"),
+                       np.datetime64(int(last_day), "D").astype("datetime64[M]") + 1)
+    return months.astype("datetime64[D]").astype("int64")
+
+
+def _nearest_checkpoint(conn, since_day):
+    """Day and client states of the latest checkpoint on or before ``since_day`` (None, {}, {} if none)"""
+    start = conn.execute(
+        "SELECT MAX(checkpoint_day) FROM capital_checkpoints WHERE checkpoint_day <= ?", (since_day,)).fetchone()[0]
+    capital, cumulative = {}, {}
+    if start is not None:
+        for client_id, capital_minor, cumulative_profit in conn.execute(
+                "SELECT client_id, capital_minor, cumulative_profit FROM capital_checkpoints "
+                "WHERE checkpoint_day = ?", (start,)):
+            capital[client_id], cumulative[client_id] = capital_minor, cumulative_profit
+    return start, capital, cumulative
+
+
+def plan_refresh(conn, since_day=None):
+    """Read-only half of ``refresh``: ``(start, ledger_rows, checkpoint_rows)`` to write from ``start`` on.
+
+    Only reads, so it can run on a read snapshot without holding the write
+    lock. The start is None for a full rebuild; the rows are column arrays,
+    ledger rows in profit day order and checkpoint rows in checkpoint order.
+    """
+    start, base_capital, base_cumulative = (
+        _nearest_checkpoint(conn, since_day) if since_day is not None else (None, {}, {}))
+    first = np.iinfo("int64").min if start is None else start
+    profit_rows = conn.execute(
+        "SELECT profit_day, total_profit_minor FROM profits WHERE profit_day >= ? ORDER BY profit_day",
+        (first,)).fetchall()
+    client_ids = np.array([r[0] for r in conn.execute("SELECT id FROM clients ORDER BY id")], dtype="int64")
+    if not profit_rows or not len(client_ids):
+        return start, (), ()
+
+    profits = np.array(profit_rows, dtype="int64")
+    profit_days = profits[:, 0]
+    flows = np.array(conn.execute(
+        "SELECT day, client_id, amount_minor FROM capital_flows WHERE day >= ? ORDER BY day",
+        (first,)).fetchall(), dtype="int64").reshape(-1, 3)
+    flow_columns = np.searchsorted(client_ids, flows[:, 1])
+    base = [np.array([state.get(cid, 0) for cid in client_ids.tolist()], dtype=float)
+            for state in (base_capital, base_cumulative)]
+
+    # Capital in minor units on each profit date, flows applied in date order
+    capital = capital_matrix(profit_days, flows[:, 0], flow_columns, flows[:, 2], len(client_ids), base[0])
+    shares, daily_gain, cum_gain = allocate_capital(from_minor(profits[:, 1]), capital)
+    cum_gain += base[1]
+
+    active = capital > 0
+    date_idx, client_idx = np.nonzero(active)
+    ledger_rows = (client_ids[client_idx], profit_days[date_idx], from_minor(capital[active]), shares[active],
+                   daily_gain[active], cum_gain[active])
+
+    # Checkpoints hold the state before each month start: flows dated earlier, gains of earlier profit dates
+    checkpoint_rows = ()
+    checkpoints = month_starts(max(first, profit_days[0] - 1), profit_days[-1])
+    if len(checkpoints):
+        cp_capital = capital_matrix(checkpoints - 1, flows[:, 0], flow_columns, flows[:, 2], len(client_ids), base[0])
+        last_profit = np.searchsorted(profit_days, checkpoints, side="left") - 1
+        cp_cumulative = np.where((last_profit >= 0)[:, np.newaxis], cum_gain[np.maximum(last_profit, 0)], base[1])
+        keep = (cp_capital != 0) | (cp_cumulative != 0)
+        cp_idx, client_idx = np.nonzero(keep)
+        checkpoint_rows = (checkpoints[cp_idx], client_ids[client_idx], np.rint(cp_capital[keep]).astype("int64"),
+                           cp_cumulative[keep])
+    return start, ledger_rows, checkpoint_rows
+
+
+def _slice_days(rows, day_column, lo, hi, side):
+    """Rows of sorted column arrays whose ``day_column`` falls between lo and hi (bounds per ``side``)"""
+    if not rows:
+        return ()
+    days = rows[day_column]
+    i = np.searchsorted(days, lo, side=side)
+    j = len(days) if hi is None else np.searchsorted(days, hi, side=side)
+    return tuple(column[i:j] for column in rows)
+
+
+def refresh_chunks(plan, chunk_rows=None):
+    """Split a plan into ``(lo, hi, ledger_rows, checkpoint_rows)`` day ranges of about ``chunk_rows`` ledger rows.
+
+    Each chunk covers ledger rows dated [lo, hi) and checkpoints dated (lo, hi];
+    hi is None for the last, open-ended chunk. One chunk when ``chunk_rows`` is None.
+    """
+    start, ledger_rows, checkpoint_rows = plan
+    bounds = [np.iinfo("int64").min if start is None else start]
+    if chunk_rows and ledger_rows:
+        bounds += [day for day in np.unique(ledger_rows[1][chunk_rows::chunk_rows]).tolist() if day > bounds[0]]
+    bounds.append(None)
+    return [(lo, hi, _slice_days(ledger_rows, 1, lo, hi, "left"), _slice_days(checkpoint_rows, 0, lo, hi, "right"))
+            for lo, hi in zip(bounds, bounds[1:])]
+
+
+def apply_refresh(conn, lo, hi, ledger_rows, checkpoint_rows):
+    """Replace the ledger rows dated [lo, hi) and checkpoints dated (lo, hi] of one chunk; returns the row count"""
+    if hi is None:
+        conn.execute("DELETE FROM client_ledger WHERE profit_day >= ?", (lo,))
+        conn.execute("DELETE FROM capital_checkpoints WHERE checkpoint_day > ?", (lo,))
+    else:
+        conn.execute("DELETE FROM client_ledger WHERE profit_day >= ? AND profit_day < ?", (lo, hi))
+        conn.execute("DELETE FROM capital_checkpoints WHERE checkpoint_day > ? AND checkpoint_day <= ?", (lo, hi))
+    if ledger_rows:
+        conn.executemany(
+            "INSERT INTO client_ledger (client_id, profit_day, capital, share, share_profit, cumulative_profit) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            zip(*(column.tolist() for column in ledger_rows)))
+    if checkpoint_rows:
+        conn.executemany(
+            "INSERT INTO capital_checkpoints (checkpoint_day, client_id, capital_minor, cumulative_profit) "
+            "VALUES (?, ?, ?, ?)",
+            zip(*(column.tolist() for column in checkpoint_rows)))
+    return len(ledger_rows[0]) if ledger_rows else 0
+
+
+def refresh(conn, since_day=None):
+    """Recompute ledger rows and checkpoints affected by a change dated epoch day ``since_day`` (everything when None).
+
+    Replays capital flows and profits from the nearest checkpoint on or before
+    ``since_day``. Runs on the caller's connection so the refresh commits
+    atomically with the write that made it necessary.
+    """
+    plan = plan_refresh(conn, since_day)
+    if plan[0] is None:
+        conn.execute("DELETE FROM ledger_dirty")
+    return apply_refresh(conn, *refresh_chunks(plan)[0])
+
+
+def rebuild(conn):
+    """Recompute the whole ledger from scratch"""
+    return refresh(conn, None)
+
+
+def mark_dirty(conn, since_day):
+    """Record in the caller's transaction that rows from epoch day ``since_day`` on need a refresh"""
+    conn.execute(
+        "INSERT INTO ledger_dirty (id, since_day) VALUES (1, ?) "
+        "ON CONFLICT (id) DO UPDATE SET since_day = MIN(since_day, excluded.since_day)", (since_day,))
+    conn.execute(
+        "INSERT INTO ledger_version (id, version) VALUES (1, 1) "
+        "ON CONFLICT (id) DO UPDATE SET version = version + 1")
+
+
+def source_version(conn):
+    """Number of changes recorded by ``mark_dirty`` so far"""
+    row = conn.execute("SELECT version FROM ledger_version WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+
+def pending_since(conn):
+    """Earliest stale day recorded by ``mark_dirty``, or None if the ledger is up to date"""
+    row = conn.execute("SELECT since_day FROM ledger_dirty WHERE id = 1").fetchone()
+    return row[0] if row else None
+
+
+def refresh_pending(conn, since_day=None):
+    """Refresh from the earlier of ``since_day`` and the recorded stale day; returns False if neither is set"""
+    days = [day for day in (since_day, pending_since(conn)) if day is not None]
+    if not days:
+        return False
+    conn.execute("DELETE FROM ledger_dirty")
+    refresh(conn, min(days))
+    return True
+
+
+def state_as_of(as_of_day, client_ids=()):
+    """Capital (minor units) and cumulative gain of every client at the end of epoch day ``as_of_day``.
+
+    Starts from the nearest checkpoint and replays only the capital flows and
+    ledger rows between it and the day, at most about a month of them, so the
+    cost does not depend on the length of the history. Returns a DataFrame of
+    (client_id, capital_minor, cumulative_profit) for clients with any capital
+    or gain by then.
+    """
+    only = f" AND client_id IN ({', '.join('?' * len(client_ids))})" if client_ids else ""
+    params = tuple(client_ids)
+    with get_manager().connection() as conn:
+        conn.execute("BEGIN")  # one snapshot for every read below
+        # The checkpoint on day K holds the state before K, so K = as_of_day + 1 still qualifies
+        start, capital, cumulative = _nearest_checkpoint(conn, as_of_day + 1)
+        start = np.iinfo("int64").min if start is None else start
+        flows = conn.execute(
+            "SELECT client_id, SUM(amount_minor) FROM capital_flows WHERE day >= ? AND day <= ?" + only
+            + " GROUP BY client_id", (start, as_of_day) + params).fetchall()
+        gains = conn.execute(
+            "SELECT client_id, SUM(share_profit) FROM client_ledger WHERE profit_day >= ? AND profit_day <= ?" + only
+            + " GROUP BY client_id", (start, as_of_day) + params).fetchall()
+    for client_id, amount in flows:
+        capital[client_id] = capital.get(client_id, 0) + amount
+    for client_id, gain in gains:
+        cumulative[client_id] = cumulative.get(client_id, 0.0) + gain
+    ids = sorted(set(capital) | set(cumulative))
+    if client_ids:
+        ids = [cid for cid in ids if cid in params]
+    return pd.DataFrame({
+        "client_id": pd.Series(ids, dtype="int64"),
+        "capital_minor": pd.Series([capital.get(cid, 0) for cid in ids], dtype="int64"),
+        "cumulative_profit": pd.Series([cumulative.get(cid, 0.0) for cid in ids], dtype=float),
+    })
+
+
+def read_ledger(client_id=None):
+    """Ledger rows (client_id, profit_date, capital, share, share_profit, cumulative_profit)
+
+    ``profit_date`` is a datetime64 column converted from epoch days, with no string parsing.
+    """
+    columns = ["client_id", "profit_date", "capital", "share", "share_profit", "cumulative_profit"]
+    query = "SELECT client_id, profit_day, capital, share, share_profit, cumulative_profit FROM client_ledger"
+    params = ()
+    if client_id is not None:
+        query += " WHERE client_id = ?"
+        params = (client_id,)
+    rows = get_manager().run_query(query + " ORDER BY client_id, profit_day", params, fetch=True)
+    rows = pd.DataFrame(rows, columns=columns)
+    rows["profit_date"] = day_array(rows["profit_date"])
+    return rows
+
+
+# Column order matches allocation.SHARE_LEDGER_COLUMNS
+_SHARE_SELECT = """
+    SELECT l.client_id, c.name, date(l.profit_day * 86400, 'unixepoch'), l.capital,
+           l.share * 100, p.total_profit_minor / 100.0, l.share_profit, l.cumulative_profit,
+           l.capital + l.cumulative_profit
+    FROM client_ledger l
+    JOIN clients c ON c.id = l.client_id
+    JOIN profits p ON p.profit_day = l.profit_day"""
+
+# Sortable share table columns; ties are broken by (client_id, profit_day) for stable paging
+SHARE_SORT_KEYS = {
+    "profit_date": "l.profit_day",
+    "client_id": "l.client_id",
+    "share_profit": "l.share_profit",
+    "balance": "l.capital + l.cumulative_profit",
+}
+
+
+def _share_frame(rows):
+    share_df = pd.DataFrame(rows, columns=SHARE_LEDGER_COLUMNS)
+    share_df["profit_date"] = pd.to_datetime(share_df["profit_date"]).dt.date
+    return share_df
+
+
+def _client_filter(client_ids, until_day=None):
+    conditions, params = [], ()
+    if client_ids:
+        conditions.append(f"l.client_id IN ({', '.join('?' * len(client_ids))})")
+        params += tuple(client_ids)
+    if until_day is not None:
+        conditions.append("l.profit_day <= ?")
+        params += (until_day,)
+    return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+
+def iter_share_rows(client_ids=(), chunk_size=10000, until_day=None):
+    """Yield the share table (client_id, profit_date order) as lists of row tuples of at most ``chunk_size``.
+
+    With ``until_day`` (an epoch day), rows dated after it are left out.
+    """
+    where, params = _client_filter(client_ids, until_day)
+    with get_manager().connection() as conn:
+        cur = conn.execute(_SHARE_SELECT + where + " ORDER BY l.client_id, l.profit_day", params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+
+def query_share_page(client_ids=(), sort_by="profit_date", ascending=False, limit=100, offset=0):
+    """One page of the share table; filtering, sorting and paging all run in SQLite"""
+    direction = "ASC" if ascending else "DESC"
+    where, params = _client_filter(client_ids)
+    rows = get_manager().run_query(
+        _SHARE_SELECT + where
+        + f" ORDER BY {SHARE_SORT_KEYS[sort_by]} {direction}, l.client_id {direction}, l.profit_day {direction}"
+        + " LIMIT ? OFFSET ?",
+        params + (int(limit), int(offset)), fetch=True)
+    return _share_frame(rows)
+
+
+def share_summary(client_ids=()):
+    """Record count, total / average share profit and distinct clients, from one aggregate query"""
+    where, params = _client_filter(client_ids)
+    records, total, average, clients = get_manager().run_query(
+        "SELECT COUNT(*), COALESCE(SUM(share_profit), 0), COALESCE(AVG(share_profit), 0), "
+        "COUNT(DISTINCT client_id) FROM client_ledger l" + where, params, fetch=True)[0]
+    return {"records": records, "total_share_profit": total, "avg_share_profit": average, "clients": clients}
+
+
+def share_totals_by_client(client_ids=()):
+    """Total share profit per client, largest first"""
+    where, params = _client_filter(client_ids)
+    rows = get_manager().run_query(
+        "SELECT l.client_id, c.name, SUM(l.share_profit) AS total FROM client_ledger l "
+        "JOIN clients c ON c.id = l.client_id" + where + " GROUP BY l.client_id ORDER BY total DESC",
+        params, fetch=True)
+    return pd.DataFrame(rows, columns=["client_id", "client_name", "share_profit"])
+
+
+def share_totals_by_date(client_ids=()):
+    """Total share profit per profit date, oldest first"""
+    where, params = _client_filter(client_ids)
+    rows = get_manager().run_query(
+        "SELECT l.profit_day, SUM(l.share_profit) FROM client_ledger l" + where
+        + " GROUP BY l.profit_day ORDER BY l.profit_day", params, fetch=True)
+    totals = pd.DataFrame(rows, columns=["profit_date", "share_profit"])
+    totals["profit_date"] = day_array(totals["profit_date"])
+    return totals
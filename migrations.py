@@ -0,0 +1,217 @@
+"""
+Versioned schema migrations.
+
+Each migration is applied at most once per database, in its own transaction,
+and the schema version is tracked in ``PRAGMA user_version``. ``init_db`` also
+remembers which database files are already up to date in this process, so
+Streamlit reruns do no DDL work at all.
+
+Migrations only change the schema. Derived tables such as the client ledger
+are rebuilt once, after the pending migrations have been applied.
+"""
+
+import threading
+
+import ledger
+from auth import hash_password
+from db import get_manager
+
+DEFAULT_CLIENT_PASSWORD = "client123"
+DEFAULT_ADMIN = ("admin", "admin123")
+
+# Every capital flow in one place: each client's initial investment on their
+# join day, then their deposits and withdrawals from capital_events
+CAPITAL_FLOWS_VIEW_SQL = """
+CREATE VIEW IF NOT EXISTS capital_flows (client_id, day, amount_minor) AS
+    SELECT id, join_day, invested_minor FROM clients
+    UNION ALL
+    SELECT client_id, event_day, amount_minor FROM capital_events"""
+
+
+def _create_core_tables(c):
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS clients (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        invested REAL NOT NULL,
+        join_date TEXT NOT NULL,
+        note TEXT
+    )""")
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS profits (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        profit_date TEXT NOT NULL UNIQUE,
+        total_profit REAL NOT NULL,
+        note TEXT
+    )""")
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS admin_users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL UNIQUE,
+        password TEXT NOT NULL
+    )""")
+
+
+def _add_client_passwords(c):
+    # Databases created before client logins existed have no password column
+    columns = [column[1] for column in c.execute("PRAGMA table_info(clients)")]
+    if "password" not in columns:
+        c.execute("ALTER TABLE clients ADD COLUMN password TEXT")
+    c.execute("UPDATE clients SET password = ? WHERE password IS NULL",
+              (hash_password(DEFAULT_CLIENT_PASSWORD),))
+
+
+def _create_default_admin(c):
+    username, password = DEFAULT_ADMIN
+    c.execute("INSERT OR IGNORE INTO admin_users (username, password) VALUES (?, ?)",
+              (username, hash_password(password)))
+
+
+def _create_client_ledger(c):
+    c.execute(ledger.LEDGER_TABLE_SQL)
+    c.execute(ledger.LEDGER_INDEX_SQL)
+
+
+def _index_client_ledger_share_profit(c):
+    c.execute(ledger.LEDGER_SHARE_PROFIT_INDEX_SQL)
+
+
+def _rebuild_table(c, table, create_sql, copy_sql):
+    """Replace ``table`` with a new definition, keeping its rows and AUTOINCREMENT counter"""
+    seq = c.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+    c.execute(create_sql.format(table=f"{table}_new"))
+    c.execute(copy_sql.format(table=f"{table}_new"))
+    c.execute(f"DROP TABLE {table}")
+    c.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    if seq:
+        c.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (seq[0], table))
+
+
+def _store_integer_days_and_amounts(c):
+    # Dates become epoch days and amounts integer minor units (see units.py)
+    _rebuild_table(c, "clients", """
+    CREATE TABLE {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        invested_minor INTEGER NOT NULL,
+        join_day INTEGER NOT NULL,
+        note TEXT,
+        password TEXT
+    )""", """
+    INSERT INTO {table} (id, name, invested_minor, join_day, note, password)
+    SELECT id, name, CAST(ROUND(invested * 100) AS INTEGER),
+           CAST(julianday(join_date) - 2440587.5 AS INTEGER), note, password
+    FROM clients""")
+    _rebuild_table(c, "profits", """
+    CREATE TABLE {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        profit_day INTEGER NOT NULL UNIQUE,
+        total_profit_minor INTEGER NOT NULL,
+        note TEXT
+    )""", """
+    INSERT INTO {table} (id, profit_day, total_profit_minor, note)
+    SELECT id, CAST(julianday(profit_date) - 2440587.5 AS INTEGER),
+           CAST(ROUND(total_profit * 100) AS INTEGER), note
+    FROM profits""")
+    # Active-capital lookups (join_day <= d) and the dashboard sums become covering index scans
+    c.execute("CREATE INDEX idx_clients_join_day ON clients(join_day, invested_minor)")
+    c.execute("CREATE INDEX idx_profits_day_amount ON profits(profit_day, total_profit_minor)")
+    # The ledger is derived data: recreate it keyed by epoch day, it is rebuilt after migrating
+    c.execute("DROP TABLE IF EXISTS client_ledger")
+    c.execute(ledger.LEDGER_TABLE_SQL)
+    c.execute(ledger.LEDGER_INDEX_SQL)
+    c.execute(ledger.LEDGER_SHARE_PROFIT_INDEX_SQL)
+
+
+def _create_capital_events(c):
+    # Deposits (positive) and withdrawals (negative) after a client's initial investment
+    c.execute("""
+    CREATE TABLE capital_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        client_id INTEGER NOT NULL REFERENCES clients(id) ON DELETE CASCADE,
+        event_day INTEGER NOT NULL,
+        amount_minor INTEGER NOT NULL,
+        note TEXT
+    )""")
+    c.execute("CREATE INDEX idx_capital_events_client ON capital_events(client_id, event_day)")
+    c.execute("CREATE INDEX idx_capital_events_day ON capital_events(event_day, client_id, amount_minor)")
+    c.execute(CAPITAL_FLOWS_VIEW_SQL)
+    # The ledger is derived data: recreate it with a capital column, it is rebuilt after migrating
+    c.execute("DROP TABLE IF EXISTS client_ledger")
+    c.execute(ledger.LEDGER_TABLE_SQL)
+    c.execute(ledger.LEDGER_INDEX_SQL)
+    c.execute(ledger.LEDGER_SHARE_PROFIT_INDEX_SQL)
+    c.execute(ledger.CHECKPOINT_TABLE_SQL)
+
+
+def _create_ledger_dirty(c):
+    c.execute(ledger.DIRTY_TABLE_SQL)
+
+
+def _create_ledger_version(c):
+    c.execute(ledger.VERSION_TABLE_SQL)
+
+
+# (version, description, function) -- append only, never renumber
+MIGRATIONS = [
+    (1, "create clients, profits and admin_users tables", _create_core_tables),
+    (2, "add password column to clients", _add_client_passwords),
+    (3, "create default admin user", _create_default_admin),
+    (4, "create materialized client_ledger table", _create_client_ledger),
+    (5, "index client_ledger by share profit for paged sorting", _index_client_ledger_share_profit),
+    (6, "store dates as epoch days and amounts as minor units, add covering indexes",
+     _store_integer_days_and_amounts),
+    (7, "add capital_events, the capital_flows view and monthly capital checkpoints", _create_capital_events),
+    (8, "create ledger_dirty table for background ledger refreshes", _create_ledger_dirty),
+    (9, "create ledger_version table so background refreshes can be planned outside the write lock",
+     _create_ledger_version),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply every pending migration to ``conn``; returns the list of applied versions"""
+    applied = []
+    for version, description, func in MIGRATIONS:
+        if version <= schema_version(conn):
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-check under the write lock in case another process migrated first
+            if version > schema_version(conn):
+                func(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                applied.append(version)
+                print(f"✅ Applied migration {version}: {description}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
+
+
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+
+def init_db(path=None):
+    """Bring the database schema up to date, once per database file per process"""
+    manager = get_manager(path)
+    if manager.path in _migrated:
+        return
+    with _migrate_lock:
+        if manager.path in _migrated:
+            return
+        with manager.connection() as conn:
+            if migrate(conn):
+                ledger.rebuild(conn)
+                conn.commit()
+            elif ledger.refresh_pending(conn):
+                # A background refresh was interrupted (e.g. the process exited): finish it now
+                conn.commit()
+        _migrated.add(manager.path)
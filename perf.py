@@ -0,0 +1,141 @@
+"""
+Lightweight per-rerun instrumentation.
+
+A ``Trace`` collects, for one Streamlit rerun (or any other unit of work), the
+wall time of named sections, every statement run on a pooled connection
+with its duration and row count, and optionally a cProfile of the whole run.
+The active trace is thread-local, since each session's script runs in its own
+thread; with no active trace, ``section`` and ``record_query`` only cost a
+thread-local lookup.
+"""
+
+import contextlib
+import cProfile
+import functools
+import io
+import marshal
+import pstats
+import threading
+import time
+
+_local = threading.local()
+
+QUERY_TEXT_LIMIT = 300
+
+
+class Trace:
+    """Sections, queries and (optionally) a cProfile recorded while the trace is active"""
+
+    def __init__(self, profile=False):
+        self.sections = []
+        self.queries = []
+        self.query_count = 0
+        self.rows_fetched = 0
+        self.wall_s = 0.0
+        self.profile_report = None
+        self.profile_data = None
+        self._stack = []
+        self._profiler = cProfile.Profile() if profile else None
+
+    @property
+    def current_section(self):
+        return self._stack[-1] if self._stack else None
+
+    def _finish_profile(self, limit=40):
+        self._profiler.disable()
+        stats = pstats.Stats(self._profiler, stream=io.StringIO())
+        # Same marshalled format as Profile.dump_stats, loadable with pstats / snakeviz
+        self.profile_data = marshal.dumps(stats.stats)
+        stats.sort_stats("cumulative").print_stats(limit)
+        self.profile_report = stats.stream.getvalue()
+        self._profiler = None
+
+
+def active_trace():
+    return getattr(_local, "trace", None)
+
+
+@contextlib.contextmanager
+def trace(profile=False):
+    """Record a ``Trace`` for the enclosed block on the current thread"""
+    current = Trace(profile)
+    previous, _local.trace = active_trace(), current
+    start = time.perf_counter()
+    if current._profiler:
+        try:
+            current._profiler.enable()
+        except ValueError:  # another thread is already profiling (one profiler at a time on 3.12+)
+            current._profiler = None
+            current.profile_report = "Profiling skipped: another session is being profiled."
+    try:
+        yield current
+    finally:
+        current.wall_s = time.perf_counter() - start
+        if current._profiler:
+            current._finish_profile()
+        _local.trace = previous
+
+
+@contextlib.contextmanager
+def section(name):
+    """Time the enclosed block as a named section of the active trace (if any)"""
+    current = active_trace()
+    if current is None:
+        yield
+        return
+    parent = current.current_section
+    record = {
+        "section": f"{parent['section']} / {name}" if parent else name,
+        "depth": len(current._stack),
+        "wall_s": 0.0,
+        "queries": 0,
+        "rows": 0,
+    }
+    current.sections.append(record)
+    current._stack.append(record)
+    queries, rows = current.query_count, current.rows_fetched
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record["wall_s"] = time.perf_counter() - start
+        record["queries"] = current.query_count - queries
+        record["rows"] = current.rows_fetched - rows
+        current._stack.pop()
+
+
+def timed(func):
+    """Decorator: run ``func`` as a section named after it"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with section(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def record_query(query, seconds, rows=0):
+    """Record one executed query in the active trace (if any); returns its record for ``record_rows``"""
+    current = active_trace()
+    if current is None:
+        return None
+    current.query_count += 1
+    current.rows_fetched += rows
+    parent = current.current_section
+    record = {
+        "query": " ".join(query.split())[:QUERY_TEXT_LIMIT],
+        "seconds": seconds,
+        "rows": rows,
+        "section": parent["section"] if parent else None,
+    }
+    current.queries.append(record)
+    return record
+
+
+def record_rows(record, rows, seconds=0.0):
+    """Add rows fetched (and the time spent fetching them) after a query was recorded"""
+    current = active_trace()
+    if record is None or current is None:
+        return
+    record["rows"] += rows
+    record["seconds"] += seconds
+    current.rows_fetched += rows
@@ -0,0 +1,171 @@
+"""
+Background ledger refresh.
+
+By default every write refreshes the materialized ledger inside its own
+transaction, so the write only returns once all derived rows are recomputed.
+When a ``RecomputeWorker`` is running for a database (the web app starts one
+per database file), writes instead record the earliest stale day in
+``ledger_dirty`` and return; the worker then refreshes the ledger on its own
+thread. Several writes in a row are coalesced into one refresh from the
+earliest day any of them touched.
+
+The worker plans the refresh on a read snapshot without the write lock, then
+writes the planned rows in day-ordered chunks of ``REFRESH_CHUNK_ROWS``, one
+short transaction each, so a write waits for one chunk at most rather than
+the whole refresh. If a write lands in between (``ledger.source_version``
+moved), the rest of the plan is dropped and the refresh is planned again
+from the end of the last committed chunk, or from the new write's day if that
+is earlier; after ``MAX_REPLANS`` such retries it runs in one transaction so
+a steady stream of writes cannot starve it.
+
+Until the last chunk commits, ``pending`` is True and the ledger lags the
+source tables: values read from the ledger (shares, gains, balances) do not
+yet reflect the latest writes, while capital read straight from the capital
+flows does, so the two may disagree. Pages show a badge saying so.
+
+The stale day is stored in the same transaction as the write, so a refresh
+interrupted by a restart is finished by ``init_db`` on the next start.
+"""
+
+import logging
+import threading
+import time
+
+import ledger
+from db import get_manager
+
+logger = logging.getLogger(__name__)
+
+# Ledger rows written per transaction by the worker
+REFRESH_CHUNK_ROWS = 5_000
+# Stale plans dropped before a refresh is done in one transaction instead
+MAX_REPLANS = 3
+
+
+class RecomputeWorker:
+    """Daemon thread that refreshes one database's ledger after writes"""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.last_duration_s = None
+        self.last_error = None
+        self._wake = threading.Condition()
+        self._requested = False
+        self._busy = False
+        self._thread = threading.Thread(target=self._run, name=f"recompute:{manager.path}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        # Pick up a refresh left pending by a previous worker
+        self.notify()
+        return self
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    @property
+    def pending(self):
+        """True while a refresh is requested or running"""
+        with self._wake:
+            return self._requested or self._busy
+
+    def notify(self):
+        """Ask for a refresh of whatever ``ledger_dirty`` records"""
+        with self._wake:
+            self._requested = True
+            self._wake.notify_all()
+
+    def wait(self, timeout=None):
+        """Block until no refresh is pending; returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._wake:
+            while self._requested or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._wake.wait(remaining)
+        return True
+
+    def _refresh_chunked(self):
+        """Refresh what ``ledger_dirty`` records in chunks; returns False if a write made the plan stale first"""
+        with self.manager.connection() as conn:
+            conn.execute("BEGIN")  # plan from one snapshot, without the write lock
+            since_day, version = ledger.pending_since(conn), ledger.source_version(conn)
+            if since_day is None:
+                return True
+            plan = ledger.plan_refresh(conn, since_day)
+        chunks = ledger.refresh_chunks(plan, REFRESH_CHUNK_ROWS)
+        for i, chunk in enumerate(chunks):
+            with self.manager.transaction() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                if ledger.source_version(conn) != version:
+                    return False
+                ledger.apply_refresh(conn, *chunk)
+                if i == len(chunks) - 1:
+                    conn.execute("DELETE FROM ledger_dirty")
+                else:
+                    # Everything before the chunk's end is up to date: a replan resumes from there
+                    conn.execute("UPDATE ledger_dirty SET since_day = ?", (chunk[1],))
+        return True
+
+    def _refresh(self):
+        for _ in range(MAX_REPLANS):
+            if self._refresh_chunked():
+                return
+        # Writes keep landing mid-refresh: finish in one transaction so the refresh cannot starve
+        with self.manager.transaction() as conn:
+            ledger.refresh_pending(conn)
+
+    def _run(self):
+        while True:
+            with self._wake:
+                while not self._requested:
+                    self._wake.wait()
+                self._requested, self._busy = False, True
+            start = time.perf_counter()
+            try:
+                self._refresh()
+                self.last_error = None
+            except Exception as e:  # keep the worker alive; the stale day stays recorded for a retry
+                logger.exception("Background ledger refresh failed")
+                self.last_error = e
+            self.last_duration_s = time.perf_counter() - start
+            with self._wake:
+                self._busy = False
+                self._wake.notify_all()
+
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def start_worker(manager=None):
+    """The running worker of ``manager``'s database (the default database when None), started if needed"""
+    manager = manager or get_manager()
+    with _workers_lock:
+        worker = _workers.get(manager.path)
+        if worker is None or not worker.is_alive():
+            worker = _workers[manager.path] = RecomputeWorker(manager).start()
+    return worker
+
+
+def get_worker(manager=None):
+    """The running worker of ``manager``'s database, or None"""
+    manager = manager or get_manager()
+    worker = _workers.get(manager.path)
+    return worker if worker is not None and worker.is_alive() else None
+
+
+def schedule(conn, since_day, manager=None):
+    """Refresh the ledger from epoch day ``since_day`` for the write in ``conn``'s open transaction.
+
+    With a running worker the refresh is deferred until after commit; without
+    one it runs now, in the caller's transaction.
+    """
+    manager = manager or get_manager()
+    ledger.mark_dirty(conn, since_day)
+    worker = get_worker(manager)
+    if worker is None:
+        ledger.refresh_pending(conn)
+        return
+    manager.on_commit(worker.notify)
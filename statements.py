@@ -0,0 +1,206 @@
+"""
+Per-client statements.
+
+A statement is one client's profit distribution history: every profit date on
+which they held capital, their capital, share and share profit, and the running
+cumulative gain and balance. Statements are written as CSV, or rendered as a
+PDF / PNG page holding the performance chart and a monthly distribution table.
+
+Figures are built in a process pool (``jobs`` spawned workers, each opening
+its own connections to the database file) and rendered by a single kaleido browser
+with ``jobs`` tabs. Starting kaleido costs far more than rendering one image,
+so it is started once per run and kept warm for every client.
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import capital
+import db
+from chart_data import chart_series
+from core import compute_client_statement, list_clients_df
+
+STATEMENT_COLUMNS = [
+    "profit_date", "total_profit", "capital", "share_pct", "share_profit", "cumulative_profit", "pct_return",
+    "balance",
+]
+
+# format -> mime type
+STATEMENT_FORMATS = {
+    "csv": "text/csv",
+    "pdf": "application/pdf",
+    "png": "image/png",
+}
+
+
+def _statement_rows(statement):
+    history = statement["history"]
+    timeseries = statement["timeseries"]
+    if timeseries is None:
+        return history.reindex(columns=STATEMENT_COLUMNS)
+
+    history = history.assign(
+        capital=timeseries["capital"],
+        share_pct=history["share"] * 100,
+        cumulative_profit=timeseries["cumulative_gain"],
+        pct_return=timeseries["pct_return"],
+    )
+    history["balance"] = history["capital"] + history["cumulative_profit"]
+    return history.loc[history["active"], STATEMENT_COLUMNS].reset_index(drop=True)
+
+
+def statement_frame(client_id, as_of=None):
+    """Statement rows for one client (active dates only, up to ``as_of`` if given), or None if the client does not exist"""
+    statement = compute_client_statement(client_id, as_of)
+    return _statement_rows(statement) if statement is not None else None
+
+
+def monthly_table(frame):
+    """Statement rows rolled up to one row per month, formatted for printing"""
+    months = frame.assign(month=frame["profit_date"].map(lambda d: d.replace(day=1))).groupby("month", sort=True)
+    table = months.agg(
+        days=("profit_date", "size"),
+        total_profit=("total_profit", "sum"),
+        share_profit=("share_profit", "sum"),
+        cumulative_profit=("cumulative_profit", "last"),
+        pct_return=("pct_return", "last"),
+        balance=("balance", "last"),
+    ).reset_index()
+    money = lambda v: f"Rp {v:,.0f}"
+    return {
+        "Month": [m.strftime("%b %Y") for m in table["month"]],
+        "Profit Days": table["days"].astype(str).tolist(),
+        "Total Profit": table["total_profit"].map(money).tolist(),
+        "Your Profit": table["share_profit"].map(money).tolist(),
+        "Cumulative Profit": table["cumulative_profit"].map(money).tolist(),
+        "Return": table["pct_return"].map(lambda v: f"{v:+.2f}%").tolist(),
+        "Balance": table["balance"].map(money).tolist(),
+    }
+
+
+def statement_figure(client_id, as_of=None):
+    """Printable statement figure (as a plain dict) for one client, or None if there is nothing to show"""
+    from charts import statement_figure as build_figure
+
+    statement = compute_client_statement(client_id, as_of)
+    if statement is None or statement["timeseries"] is None:
+        return None
+    frame = _statement_rows(statement)
+    if frame.empty:
+        return None
+    timeseries = statement["timeseries"]
+    title = (f"<b>{timeseries['name']}</b> · Statement to {frame['profit_date'].iloc[-1]:%d %b %Y}"
+             f"<br><sup>Capital Rp {timeseries['capital'][-1]:,.0f} · Client since {pd.to_datetime(timeseries['join_date']):%d %b %Y}"
+             f" · Balance Rp {frame['balance'].iloc[-1]:,.0f} ({frame['pct_return'].iloc[-1]:+.2f}%)</sup>")
+    series = chart_series(timeseries["dates"], timeseries["pct_return"])
+    return build_figure(title, series, pd.DataFrame(monthly_table(frame))).to_dict()
+
+
+def _statement_path(directory, client_id, fmt):
+    return os.path.join(directory, f"statement_{client_id}.{fmt}")
+
+
+def write_statement(client_id, directory, as_of=None):
+    """Write one client's statement as CSV into ``directory``; returns the file path (None if no such client)"""
+    frame = statement_frame(client_id, as_of)
+    if frame is None:
+        return None
+    path = _statement_path(directory, client_id, "csv")
+    frame.to_csv(path, index=False)
+    return path
+
+
+def _init_worker(db_path):
+    # SQLite connections must never cross a fork: start from empty pools and indexes
+    db._managers.clear()
+    capital._indexes.clear()
+    db.DB_PATH = db_path
+
+
+def _map(func, client_ids, jobs, *args):
+    """``func(client_id, *args)`` for every client, spread over ``jobs`` processes when jobs > 1"""
+    if jobs <= 1 or len(client_ids) <= 1:
+        return [func(cid, *args) for cid in client_ids]
+    # Spawned, not forked: the parent (e.g. the Streamlit server) is multi-threaded and holds pooled connections
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(db.current_path(),)) as pool:
+        return list(pool.map(func, client_ids, *([arg] * len(client_ids) for arg in args),
+                             chunksize=max(1, len(client_ids) // (jobs * 4))))
+
+
+def _render(figures, fmt, jobs):
+    """Render ``(figure dict, path)`` pairs with one kaleido browser using ``jobs`` tabs"""
+    try:
+        import kaleido
+        from kaleido.errors import ChromeNotFoundError
+    except ImportError as e:
+        raise RuntimeError("PDF / PNG statements require kaleido 1.0 or later: pip install -U 'kaleido>=1.0'") from e
+
+    # Page size comes from each figure's layout
+    specs = [{"fig": fig, "path": path, "opts": {"format": fmt}} for fig, path in figures]
+    try:
+        errors = kaleido.write_fig_from_object_sync(specs, kopts={"n": max(1, jobs), "mathjax": False})
+    except ChromeNotFoundError as e:
+        raise RuntimeError("kaleido needs Chrome to render statements: run `plotly_get_chrome`") from e
+    if errors:
+        raise RuntimeError(f"Failed to render {len(errors)} statement(s): {errors[0]}")
+
+
+def write_statements(directory, client_ids=None, jobs=1, fmt="csv", as_of=None):
+    """Write statements for ``client_ids`` (all clients when None) in ``fmt``, using ``jobs`` workers.
+
+    Statements cover profit dates up to ``as_of`` (every date when None).
+    Returns the written paths in client order; clients without any statement
+    data are skipped.
+    """
+    if client_ids is None:
+        client_ids = list_clients_df()["id"].tolist()
+    os.makedirs(directory, exist_ok=True)
+    if fmt == "csv":
+        paths = _map(write_statement, client_ids, jobs, directory, as_of)
+        return [path for path in paths if path]
+
+    figures = [
+        (fig, _statement_path(directory, cid, fmt))
+        for cid, fig in zip(client_ids, _map(statement_figure, client_ids, jobs, as_of))
+        if fig is not None
+    ]
+    if figures:
+        _render(figures, fmt, jobs)
+    return [path for _, path in figures]
+
+
+def render_statement(client_id, fmt="pdf"):
+    """One client's rendered statement as bytes, or None if there is nothing to show"""
+    fig = statement_figure(client_id)
+    if fig is None:
+        return None
+    with tempfile.TemporaryDirectory(prefix="statement_") as work_dir:
+        path = _statement_path(work_dir, client_id, fmt)
+        _render([(fig, path)], fmt, 1)
+        with open(path, "rb") as f:
+            return f.read()
+
+
+def statement_archive(fmt="pdf", client_ids=None, jobs=1, directory=None, as_of=None):
+    """Write statements into a new temporary zip archive; returns (path, mime type, statement count)"""
+    fd, path = tempfile.mkstemp(prefix="statements_", suffix=".zip", dir=directory)
+    os.close(fd)
+    work_dir = tempfile.mkdtemp(prefix="statements_")
+    try:
+        paths = write_statements(work_dir, client_ids, jobs, fmt, as_of)
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for statement_path in paths:
+                archive.write(statement_path, os.path.basename(statement_path))
+    except Exception:
+        os.remove(path)
+        raise
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return path, "application/zip", len(paths)
@@ -4,6 +4,8 @@ Quick test script to verify imports and basic functionality
 Run this before running the main app to catch errors early
 """
 
+import os
+import subprocess
 import sys
 
 def test_imports():
@@ -40,7 +42,6 @@ def test_imports():
     
     try:
         import plotly.graph_objects as go
-        import plotly.express as px
         print("✓ Plotly imported")
     except ImportError as e:
         print(f"✗ Plotly import failed: {e}")
@@ -56,6 +57,21 @@ def test_imports():
     
     return True
 
+def test_core_import():
+    """Test that the data layer imports without the UI stack"""
+    print("\nTesting headless core import...")
+    
+    # A fresh interpreter: streamlit and plotly may already be loaded in this one
+    check = ("import sys, core; "
+             "ui = [m for m in ('streamlit', 'plotly') if m in sys.modules]; "
+             "sys.exit('core pulled in UI modules: ' + ', '.join(ui) if ui else 0)")
+    result = subprocess.run([sys.executable, "-c", check], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"✗ {result.stderr.strip() or 'core import failed'}")
+    assert result.returncode == 0, result.stderr
+    print("✓ core imported without Streamlit or Plotly")
+
 def test_date_functionality():
     """Test date functionality"""
     print("\nTesting date functionality...")
@@ -81,11 +97,16 @@ if __name__ == "__main__":
     print("Investment Consortium App - Pre-flight Check")
     print("=" * 50)
     
+    try:
+        test_core_import()
+        core_ok = True
+    except AssertionError:
+        core_ok = False
     imports_ok = test_imports()
     date_ok = test_date_functionality()
     
     print("\n" + "=" * 50)
-    if imports_ok and date_ok:
+    if core_ok and imports_ok and date_ok:
         print("✓ All tests passed! You can run the app.")
         print("\nRun the app with:")
         print("  streamlit run app.py")
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Ledger consistency check.
+
+Builds a random consortium in a temporary database and applies random edits
+(clients, deposits, withdrawals and profits) through core.py. After every
+edit the incrementally refreshed ledger and monthly checkpoints must match a
+full rebuild; as-of balances must match the client timeseries; and the
+background worker's chunked refresh must end in the same ledger as a rebuild;
+and writes from another process must show up in this process's shares.
+Run with pytest, or directly.
+"""
+
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import numpy as np
+
+import core
+import db
+import ledger
+import recompute
+from migrations import init_db
+
+START = date(2023, 1, 1)
+N_CLIENTS = 12
+N_DAYS = 240
+
+
+def _snapshot(manager):
+    with manager.connection() as conn:
+        rows = conn.execute(
+            "SELECT client_id, profit_day, capital, share, share_profit, cumulative_profit "
+            "FROM client_ledger ORDER BY client_id, profit_day").fetchall()
+        checkpoints = conn.execute(
+            "SELECT checkpoint_day, client_id, capital_minor, cumulative_profit "
+            "FROM capital_checkpoints ORDER BY checkpoint_day, client_id").fetchall()
+    return np.array(rows, dtype=float).reshape(-1, 6), np.array(checkpoints, dtype=float).reshape(-1, 4)
+
+
+def _assert_matches_rebuild(manager):
+    refreshed = _snapshot(manager)
+    with manager.transaction() as conn:
+        ledger.rebuild(conn)
+    for table, a, b in zip(("client_ledger", "capital_checkpoints"), refreshed, _snapshot(manager)):
+        assert a.shape == b.shape, f"{table}: {len(a)} rows refreshed, {len(b)} rebuilt"
+        assert np.allclose(a, b, rtol=1e-9, atol=1e-6), f"{table} differs from a rebuild"
+
+
+def _day(rng, first=0, last=N_DAYS):
+    return (START + timedelta(days=rng.randint(first, last))).isoformat()
+
+
+@contextmanager
+def _random_fund(seed):
+    """Temporary database holding a random consortium; yields its connection manager and rng"""
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory(prefix="ledger_check_") as tmp:
+        path = os.path.join(tmp, "fund.db")
+        with db.use_database(path):
+            init_db()
+            for i in range(N_CLIENTS):
+                core.add_client(f"Client {i}", rng.randint(1, 100) * 1_000_000, _day(rng, 0, N_DAYS // 2))
+            for day in range(0, N_DAYS, 2):
+                core.add_profit(_day(rng, day, day), rng.randint(-50, 200) * 10_000)
+            yield db.get_manager(), rng
+            db.get_manager().close_all()
+
+
+def _random_edit(rng):
+    """One random write through core.py; edits the capital rules or unique profit dates reject are skipped"""
+    clients = core.list_clients_df()
+    client = clients.iloc[rng.randrange(len(clients))]
+    kind = rng.choice(["deposit", "withdrawal", "undo", "profit", "edit profit", "drop profit", "client", "join"])
+    try:
+        if kind in ("deposit", "withdrawal"):
+            amount = rng.randint(1, 50) * 1_000_000 * (1 if kind == "deposit" else -1)
+            core.add_capital_event(int(client["id"]), _day(rng), amount)
+        elif kind == "undo":
+            events = core.list_capital_events_df()
+            if len(events):
+                core.delete_capital_event(int(events["id"].iloc[rng.randrange(len(events))]))
+        elif kind == "client":
+            core.add_client("New client", rng.randint(1, 100) * 1_000_000, _day(rng))
+        elif kind == "join":
+            core.update_client(int(client["id"]), client["name"], client["invested"] + 1_000_000, _day(rng))
+        else:
+            profits = core.list_profits_df()
+            profit_id = int(profits["id"].iloc[rng.randrange(len(profits))])
+            if kind == "profit":
+                core.add_profit(_day(rng), rng.randint(-50, 200) * 10_000)
+            elif kind == "edit profit":
+                core.update_profit(profit_id, _day(rng), rng.randint(-50, 200) * 10_000)
+            else:
+                core.delete_profit(profit_id)
+    except (ValueError, sqlite3.IntegrityError):
+        pass
+
+
+def test_incremental_refresh_matches_rebuild():
+    """Every write's checkpoint replay leaves the same ledger as a rebuild"""
+    with _random_fund(1) as (manager, rng):
+        for _ in range(60):
+            _random_edit(rng)
+            _assert_matches_rebuild(manager)
+        with manager.transaction() as conn:
+            conn.execute("DELETE FROM clients WHERE id = 1")
+            recompute.schedule(conn, 0)
+        _assert_matches_rebuild(manager)
+    print("✓ Incremental ledger refreshes match a full rebuild")
+
+
+def test_balances_as_of_match_timeseries():
+    """Checkpoint-based as-of balances equal the timeseries on every sampled profit date"""
+    with _random_fund(2) as (manager, rng):
+        for _ in range(20):
+            _random_edit(rng)
+        timeseries, _, _ = core.compute_client_timeseries()
+        for column in rng.sample(range(len(timeseries.dates)), 15):
+            as_of = str(timeseries.dates[column])
+            balances = core.balances_as_of(as_of).set_index("id")
+            for client_id in timeseries:
+                row = timeseries.row(client_id)
+                capital, gain = timeseries.capital[row, column], timeseries.cumulative_gain[row, column]
+                if capital > 0:
+                    assert np.isclose(balances.at[client_id, "capital"], capital), (as_of, client_id)
+                    assert np.isclose(balances.at[client_id, "cumulative_gain"], gain, atol=1e-6), (as_of, client_id)
+    print("✓ As-of balances match the client timeseries")
+
+
+def test_background_refresh_matches_rebuild():
+    """The worker's chunked refresh, interrupted by writes, converges on a rebuild"""
+    chunk_rows = recompute.REFRESH_CHUNK_ROWS
+    recompute.REFRESH_CHUNK_ROWS = 50
+    try:
+        with _random_fund(3) as (manager, rng):
+            worker = recompute.start_worker(manager)
+            for _ in range(30):
+                _random_edit(rng)
+            assert worker.wait(30), "background refresh did not finish"
+            assert worker.last_error is None, worker.last_error
+            with manager.connection() as conn:
+                assert ledger.pending_since(conn) is None
+            _assert_matches_rebuild(manager)
+    finally:
+        recompute.REFRESH_CHUNK_ROWS = chunk_rows
+    print("✓ Background chunked refresh matches a full rebuild")
+
+
+def test_writes_from_another_process():
+    """Capital added by another process changes this process's shares and statements"""
+    with _random_fund(4) as (manager, rng):
+        as_of = _day(rng, N_DAYS, N_DAYS)
+        before = core.balances_as_of(as_of)["share"].sum()
+        subprocess.run(
+            [sys.executable, "-c", "import sys, core, db; db.DB_PATH = sys.argv[1]; "
+             "core.add_client('Other process', 500_000_000, sys.argv[2])", manager.path, _day(rng, 0, 0)],
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+        assert np.isclose(before, 1.0) and np.isclose(core.balances_as_of(as_of)["share"].sum(), 1.0)
+        assert np.isclose(core.allocations_for_date(as_of)["share"].sum(), 1.0)
+        with manager.connection() as conn:
+            expected = conn.execute("SELECT SUM(share_profit) FROM client_ledger WHERE client_id = 1").fetchone()[0]
+        assert np.isclose(core.compute_client_statement(1)["history"]["share_profit"].sum(), expected)
+    print("✓ Writes from another process reach this process's shares")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("Ledger consistency check")
+    print("=" * 50)
+    test_incremental_refresh_matches_rebuild()
+    test_balances_as_of_match_timeseries()
+    test_background_refresh_matches_rebuild()
+    test_writes_from_another_process()
+    print("\n✓ All ledger checks passed")
+    sys.exit(0)
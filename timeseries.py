@@ -0,0 +1,110 @@
+"""
+Columnar per-client timeseries.
+
+``TimeseriesResult`` holds every client's capital, cumulative gain and return
+on one shared datetime64 date axis, as C x P float64 matrices with one row per
+client, plus a client id -> row index. Per-client access returns numpy views
+into those rows, so nothing is copied or boxed into Python floats until a
+caller asks for it. ``as_dict`` adapts the result to the older shape, a dict
+of per-client dicts of Python lists, for code that still expects it.
+"""
+
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+from allocation import pct_return
+
+
+class ClientSeries:
+    """One client's row of a ``TimeseriesResult``; the arrays are views, not copies"""
+
+    __slots__ = ("client_id", "name", "invested", "join_date", "dates", "capital", "cumulative_gain", "pct_return")
+
+    def __init__(self, client_id, name, invested, join_date, dates, capital, cumulative_gain, returns):
+        self.client_id = client_id
+        self.name = name
+        self.invested = invested
+        self.join_date = join_date
+        self.dates = dates
+        self.capital = capital
+        self.cumulative_gain = cumulative_gain
+        self.pct_return = returns
+
+    def to_dict(self):
+        """The legacy per-client dict of Python lists"""
+        return {
+            "name": self.name,
+            "invested": self.invested,
+            "join_date": self.join_date,
+            "dates": self.dates.astype(object).tolist(),
+            "capital": self.capital.tolist(),
+            "cumulative_gain": self.cumulative_gain.tolist(),
+            "pct_return": self.pct_return.tolist(),
+        }
+
+
+class TimeseriesResult:
+    """Capital, cumulative gain and return of every client (rows) on every profit date (columns)"""
+
+    def __init__(self, dates, clients, capital, cumulative_gain):
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.clients = clients.reset_index(drop=True)
+        self.client_ids = self.clients["id"].to_numpy(dtype="int64")
+        self.capital = np.ascontiguousarray(capital, dtype=float)
+        self.cumulative_gain = np.ascontiguousarray(cumulative_gain, dtype=float)
+        self.pct_return = pct_return(self.cumulative_gain, self.capital)
+        self._rows = {cid: i for i, cid in enumerate(self.client_ids.tolist())}
+
+    @classmethod
+    def empty(cls):
+        return cls([], pd.DataFrame(columns=["id", "name", "invested", "join_date"]), np.zeros((0, 0)), np.zeros((0, 0)))
+
+    def __len__(self):
+        return len(self.client_ids)
+
+    def __contains__(self, client_id):
+        return client_id in self._rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def row(self, client_id):
+        """Matrix row of ``client_id`` (KeyError if unknown)"""
+        return self._rows[client_id]
+
+    def client(self, client_id):
+        """``ClientSeries`` view of one client (KeyError if unknown)"""
+        i = self._rows[client_id]
+        info = self.clients.iloc[i]
+        return ClientSeries(client_id, info["name"], info["invested"], info["join_date"], self.dates,
+                            self.capital[i], self.cumulative_gain[i], self.pct_return[i])
+
+    def get(self, client_id, default=None):
+        return self.client(client_id) if client_id in self._rows else default
+
+    @property
+    def nbytes(self):
+        """Memory held by the date axis and the matrices"""
+        return self.dates.nbytes + self.capital.nbytes + self.cumulative_gain.nbytes + self.pct_return.nbytes
+
+    def as_dict(self):
+        """Read-only mapping of client id -> legacy per-client dict, built on access"""
+        return TimeseriesDict(self)
+
+
+class TimeseriesDict(Mapping):
+    """Compatibility adapter giving a ``TimeseriesResult`` the old dict-of-dicts shape"""
+
+    def __init__(self, result):
+        self.result = result
+
+    def __getitem__(self, client_id):
+        return self.result.client(client_id).to_dict()
+
+    def __iter__(self):
+        return iter(self.result)
+
+    def __len__(self):
+        return len(self.result)
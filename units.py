@@ -0,0 +1,43 @@
+"""
+Storage encoding of dates and amounts.
+
+Dates are stored as integer days since 1970-01-01 ("epoch days") and money as
+integer minor-currency units (sen, 1/100 Rupiah). Integers compare and index
+cheaply in SQLite and convert to numpy datetime64[D] without string parsing.
+The public Python API keeps ISO date strings and float amounts; queries
+convert back with ``date(day * 86400, 'unixepoch')`` and ``units / 100.0``.
+"""
+
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+EPOCH = date(1970, 1, 1)
+MINOR_UNITS = 100
+
+
+def to_day(value):
+    """Epoch day of a date, datetime or ISO date string"""
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    elif isinstance(value, datetime):
+        value = value.date()
+    return (value - EPOCH).days
+
+
+def from_day(day):
+    """ISO date string of an epoch day"""
+    return (EPOCH + timedelta(days=int(day))).isoformat()
+
+
+def to_minor(amount):
+    return int(round(float(amount) * MINOR_UNITS))
+
+
+def from_minor(units):
+    return units / MINOR_UNITS
+
+
+def day_array(days):
+    """numpy datetime64[D] array from epoch days"""
+    return np.asarray(days, dtype="int64").astype("datetime64[D]")